@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from corsheaders.defaults import default_headers
 from dotenv import load_dotenv 
@@ -70,7 +71,7 @@ REST_FRAMEWORK = {
    
 }
 
-REST_FRAMEWORK['DEFAULT_PAGINATION_CLASS'] = 'rest_framework.pagination.PageNumberPagination'
+REST_FRAMEWORK['DEFAULT_PAGINATION_CLASS'] = 'core.pagination.HubPagination'
 REST_FRAMEWORK['PAGE_SIZE'] = 10
 
 
@@ -166,6 +167,39 @@ DATABASES = {
 
 
 
+# Cache
+# File-backed by default so every worker on a host shares the book cache;
+# set CACHE_BACKEND (and CACHE_LOCATION) to use something else.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'wellbeing-hub-cache')),
+    }
+}
+
+
+# Grading
+# When True, submissions are stored as 'pending' and graded by
+# `manage.py run_grading_workers` instead of inside the request.
+
+ASYNC_GRADING = os.environ.get('ASYNC_GRADING', 'False') == 'True'
+
+# Processes used to regrade past submissions after an answer key changes
+# (0 = one per CPU, 1 = grade in the worker itself). Regrades are only applied
+# while `manage.py run_grading_workers` runs, so deploy it as a worker process.
+
+REGRADE_PROCESSES = int(os.environ.get('REGRADE_PROCESSES', '0'))
+
+# Timed quiz sessions: submissions up to QUIZ_LATE_GRACE seconds past a quiz's
+# duration are accepted but flagged late; later ones are rejected. Submissions
+# to timed and question-bank quizzes must carry the session token from the
+# quiz's start endpoint; with QUIZ_SESSIONS_REQUIRED untimed quizzes need it too.
+
+QUIZ_LATE_GRACE = int(os.environ.get('QUIZ_LATE_GRACE', '30'))
+QUIZ_SESSIONS_REQUIRED = os.environ.get('QUIZ_SESSIONS_REQUIRED', 'False') == 'True'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
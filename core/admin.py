@@ -1,7 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
-from django.utils import timezone
 from .models import (
     Book,
     Transaction,
@@ -14,6 +13,7 @@ from .models import (
     Journal,
     ForumPost,
 )
+from . import library
 
 User = get_user_model()
 
@@ -21,6 +21,22 @@ User = get_user_model()
 # Library models
 # -------------------------
 
+@admin.action(description="Mark selected transactions as returned")
+def mark_as_returned(modeladmin, request, queryset):
+    user = request.user
+    returned = library.return_transactions(queryset)
+    modeladmin.message_user(
+        request,
+        f"{returned} transactions marked as returned by {user}."
+    )
+
+
+@admin.action(description="Recompute copies available from open transactions")
+def recompute_copies_available(modeladmin, request, queryset):
+    updated = library.recompute_copies_available(queryset)
+    modeladmin.message_user(request, f"Stock recomputed for {updated} books.")
+
+
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = (
@@ -29,26 +45,13 @@ class BookAdmin(admin.ModelAdmin):
         "isbn",
         "published_date",
         "copies_available",
+        "total_copies",
         "genre",
     )
     search_fields = ("title", "author", "isbn", "genre")
     list_filter = ("published_date", "genre")
     ordering = ("title",)
-
-
-@admin.action(description="Mark selected transactions as returned")
-def mark_as_returned(modeladmin, request, queryset):
-    user = request.user
-    for transaction in queryset.filter(return_date__isnull=True):
-        transaction.return_date = timezone.now()
-        transaction.status = "returned"
-        transaction.book.copies_available += 1
-        transaction.book.save()
-        transaction.save()
-    modeladmin.message_user(
-        request,
-        f"{queryset.count()} transactions marked as returned by {user}."
-    )
+    actions = [recompute_copies_available]
 
 
 @admin.register(Transaction)
@@ -64,6 +67,7 @@ class TransactionAdmin(admin.ModelAdmin):
     )
     list_filter = ("status", "checkout_date", "return_date", "due_date")
     readonly_fields = ("checkout_date", "due_date", "return_date")
+    list_select_related = ("user", "book")
     ordering = ("-checkout_date",)
     actions = [mark_as_returned]
 
@@ -112,6 +116,7 @@ class MentorshipRequestAdmin(admin.ModelAdmin):
     list_display = ("student", "mentor", "status", "requested_at")
     list_filter = ("status", "requested_at")
     readonly_fields = ("requested_at",)
+    list_select_related = ("student", "mentor")
     ordering = ("-requested_at",)
     actions = [approve_requests]
 
@@ -131,7 +136,8 @@ class MoodAdmin(admin.ModelAdmin):
 @admin.register(Journal)
 class JournalAdmin(admin.ModelAdmin):
     list_display = ("user", "created_at")
-    search_fields = ("entry",)
+    # Entry text is searched by its owner through the journal API, not scanned here
+    search_fields = ("user__username",)
     readonly_fields = ("created_at",)
     ordering = ("-created_at",)
 
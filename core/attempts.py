@@ -0,0 +1,161 @@
+import hashlib
+import random
+import time
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from .models import QuizAttempt
+from . import grading
+
+
+# -------------------------
+# Quiz Attempts and Question Banks
+# -------------------------
+
+def attempt_seed(quiz_id, user_id, number):
+    '''Stable per (quiz, student, attempt) and unguessable without SECRET_KEY; fits a signed 64-bit column.'''
+    digest = hashlib.sha256(f'{settings.SECRET_KEY}:quiz-attempt:{quiz_id}:{user_id}:{number}'.encode()).digest()
+    return int.from_bytes(digest[:8], 'big') >> 1
+
+
+def draw(key, sample_size, seed):
+    '''
+    Question ids for one attempt.
+
+    The ids come from the compiled answer key, which is already cached per
+    quiz, so a draw is a seeded random.sample over an in-memory array: no
+    ORDER BY RANDOM(), no query at all. Without a sample size every question
+    is used, in the usual order.
+    '''
+    ids = [entry[0] for entry in key]
+    if sample_size is None:
+        return ids
+    return random.Random(seed).sample(ids, min(sample_size, len(ids)))
+
+
+def open_attempt(user, quiz_id):
+    '''The student's latest attempt at the quiz that has not been submitted yet, or None.'''
+    return (
+        QuizAttempt.objects
+        .filter(user=user, quiz_id=quiz_id, submission__isnull=True)
+        .order_by('-number')
+        .first()
+    )
+
+
+def start(user, quiz):
+    '''
+    The student's running attempt at the quiz, or a new one; returns (attempt, session).
+
+    Starting again before submitting returns the same questions and the same
+    clock. Once an attempt's time is up, or after a submission, a new attempt
+    gets a new, equally reproducible draw.
+    '''
+    attempt = open_attempt(user, quiz.pk)
+    session = attempt and resume_session(attempt, quiz)
+    if session:
+        return attempt, session
+    number = (QuizAttempt.objects.filter(user=user, quiz=quiz).aggregate(n=Max('number'))['n'] or 0) + 1
+    seed = attempt_seed(quiz.pk, user.pk, number)
+    try:
+        with transaction.atomic():
+            attempt = QuizAttempt.objects.create(
+                quiz=quiz, user=user, number=number, seed=seed,
+                question_ids=draw(grading.answer_key(quiz.pk), quiz.sample_size, seed),
+            )
+    except IntegrityError:
+        # A parallel request started the same attempt first
+        attempt = open_attempt(user, quiz.pk)
+        return attempt, resume_session(attempt, quiz)
+    return attempt, open_session(attempt, quiz)
+
+
+def questions(attempt):
+    '''The attempt's questions as shown to the student, in drawn order, without answers.'''
+    key = grading.select(grading.answer_key(attempt.quiz_id), attempt.question_ids)
+    return [{'id': question_id, 'text': text} for question_id, text, _, _ in key]
+
+
+# -------------------------
+# Timed Sessions
+# -------------------------
+
+# A running attempt lives in the cache as {'started', 'limit', 'question_ids'}
+# until its time plus the grace period is up, then simply expires. The student
+# holds a signed token naming the attempt, so checking a submission is a
+# signature check and one cache read; the database is only consulted if the
+# entry was lost with the cache.
+SESSION_SALT = 'core.quiz-session'
+
+# Lifetime of sessions for quizzes without a positive duration
+UNTIMED_SESSION_TTL = 24 * 60 * 60
+
+
+class SessionError(Exception):
+    '''The submission's quiz session is invalid or over.'''
+
+
+def _session_key(attempt_id):
+    return f'quiz-session:{attempt_id}'
+
+
+def session_token(attempt):
+    return signing.dumps({'attempt': attempt.pk, 'quiz': attempt.quiz_id, 'user': attempt.user_id}, salt=SESSION_SALT)
+
+
+def open_session(attempt, quiz):
+    '''Cache the attempt's clock and questions until its time is up; None if it already is.'''
+    started = attempt.started_at.timestamp()
+    limit = quiz.duration * 60 if quiz.duration > 0 else None
+    if limit is None:
+        remaining = UNTIMED_SESSION_TTL
+    else:
+        remaining = started + limit + settings.QUIZ_LATE_GRACE - time.time()
+        if remaining <= 0:
+            return None
+    session = {'started': started, 'limit': limit, 'question_ids': attempt.question_ids}
+    cache.set(_session_key(attempt.pk), session, remaining)
+    return session
+
+
+def resume_session(attempt, quiz):
+    return cache.get(_session_key(attempt.pk)) or open_session(attempt, quiz)
+
+
+def check_session(token, user, quiz):
+    '''
+    Validate a submission's session token; returns (attempt_id, session, late).
+
+    Raises SessionError for forged or foreign tokens and for attempts whose
+    time, including the grace period, has run out.
+    '''
+    try:
+        data = signing.loads(token, salt=SESSION_SALT)
+    except signing.BadSignature:
+        raise SessionError('Invalid quiz session')
+    if data.get('quiz') != quiz.pk or data.get('user') != user.pk:
+        raise SessionError('Invalid quiz session')
+
+    session = cache.get(_session_key(data['attempt']))
+    if session is None:
+        attempt = QuizAttempt.objects.filter(pk=data['attempt'], submission__isnull=True).first()
+        session = attempt and open_session(attempt, quiz)
+        if not session:
+            raise SessionError('Time is up for this attempt')
+
+    if session['limit'] is None:
+        return data['attempt'], session, False
+    elapsed = time.time() - session['started']
+    if elapsed > session['limit'] + settings.QUIZ_LATE_GRACE:
+        raise SessionError('Time is up for this attempt')
+    return data['attempt'], session, elapsed > session['limit']
+
+
+def finish(attempt_id, submission):
+    '''Link the submission to its attempt and end the session; False if the attempt was already submitted.'''
+    if not QuizAttempt.objects.filter(pk=attempt_id, submission__isnull=True).update(submission=submission):
+        return False
+    transaction.on_commit(lambda: cache.delete(_session_key(attempt_id)))
+    return True
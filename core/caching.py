@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import uuid
+from collections import defaultdict
+from django.core.cache import cache
+from django.db import transaction
+
+
+# -------------------------
+# Versioned Caches
+# -------------------------
+
+# Payloads are stored under the current version token of what they depend on:
+#   - book detail -> that book's version
+#   - list pages  -> the catalogue version
+# Writes only bump versions, so stale entries are never read again and simply
+# age out. Tokens are random rather than counters so that an evicted version
+# key can never be re-issued and resurrect an old payload.
+PAYLOAD_TIMEOUT = 60 * 60
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+
+
+def _count(kind, outcome):
+    with _stats_lock:
+        _stats[kind][outcome] += 1
+
+
+def stats(kind='books'):
+    '''Hit/miss counters for this worker process.'''
+    with _stats_lock:
+        hits, misses = _stats[kind]['hits'], _stats[kind]['misses']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 3) if total else None}
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _cached(key, build, kind):
+    payload = cache.get(key)
+    if payload is not None:
+        _count(kind, 'hits')
+        return payload
+    _count(kind, 'misses')
+    payload = build()
+    cache.set(key, payload, PAYLOAD_TIMEOUT)
+    return payload
+
+
+def get_book(pk, build):
+    '''Serialized detail payload for one book; `build` runs on a miss.'''
+    return _cached(f'book:{pk}:{_version(f"book:{pk}:version")}', build, 'books')
+
+
+def get_book_page(request, build):
+    '''Serialized list page for the given request; `build` runs on a miss.'''
+    params = sorted(request.query_params.lists())
+    digest = hashlib.sha1(repr((request.get_host(), params)).encode()).hexdigest()
+    return _cached(f'books:{_version("books:version")}:{digest}', build, 'books')
+
+
+def bump_books(pks=()):
+    '''Invalidate the given books (and every list page) once the current transaction commits.'''
+    def bump():
+        cache.set_many({f'book:{pk}:version': uuid.uuid4().hex for pk in pks}, timeout=None)
+        cache.set('books:version', uuid.uuid4().hex, timeout=None)
+    transaction.on_commit(bump)
+
+
+# -------------------------
+# Compiled Quiz Answer Keys
+# -------------------------
+
+# Bumped whenever the cached key's layout changes, so old pickles are never read
+ANSWER_KEY_FORMAT = 2
+
+# Process-local compiled keys, under the same versioned cache keys. The shared
+# version token is still read on every call, so a bump anywhere invalidates
+# them; only the payload fetch, unpickle and compile are skipped.
+LOCAL_ANSWER_KEYS = 512
+_local_answer_keys = {}
+
+
+def get_answer_key(quiz_id, build, compile=None):
+    '''
+    The quiz's answer key; `build` runs on a miss.
+
+    The shared cache holds what `build` returns; `compile`, if given, turns
+    that into the object handed back and is run once per process.
+    '''
+    key = f'quiz:{quiz_id}:key{ANSWER_KEY_FORMAT}:{_version(f"quiz:{quiz_id}:version")}'
+    compiled = _local_answer_keys.get(key)
+    if compiled is not None:
+        _count('answer_keys', 'hits')
+        return compiled
+    payload = _cached(key, build, 'answer_keys')
+    compiled = compile(payload) if compile else payload
+    if len(_local_answer_keys) >= LOCAL_ANSWER_KEYS:
+        _local_answer_keys.clear()
+    _local_answer_keys[key] = compiled
+    return compiled
+
+
+def bump_quiz(quiz_id):
+    '''Drop the quiz's compiled answer key once the current transaction commits.'''
+    transaction.on_commit(lambda: cache.set(f'quiz:{quiz_id}:version', uuid.uuid4().hex, timeout=None))
@@ -0,0 +1,149 @@
+import datetime
+from itertools import islice
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from .models import MoodRollup
+
+
+# -------------------------
+# Cohort Wellbeing Analytics
+# -------------------------
+
+# User fields a cohort can be defined by
+GROUP_FIELDS = ['country', 'role']
+
+# Cohorts with fewer students than this are left out, so no one can be singled out
+MIN_COHORT_USERS = 5
+
+# Rollup rows converted to arrays per step
+CHUNK_SIZE = 10_000
+
+# Days in the moving average, and the length of a "week" for week-over-week deltas
+WINDOW = 7
+
+RESULT_TIMEOUT = 10 * 60
+
+
+def _cube(since, until, group_by):
+    '''
+    Mood counts as a (cohorts x days x moods) array.
+
+    Reads the daily mood rollups already grouped by cohort in SQL, so the rows
+    returned scale with cohorts x days x moods rather than with the number of
+    moods logged, and streams them into index arrays chunk by chunk.
+    Returns (cohort keys, mood labels, cube).
+    '''
+    days = (until - since).days + 1
+    rows = (
+        MoodRollup.objects.filter(bucket='day', period__gte=since, period__lte=until)
+        .values_list(*[f'user__{field}' for field in group_by], 'period', 'mood')
+        .annotate(n=Sum('count'))
+        .order_by()
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    cohorts, moods, parts = {}, {}, []
+    while chunk := list(islice(rows, CHUNK_SIZE)):
+        parts.append(np.array(
+            [
+                (cohorts.setdefault(row[:-3], len(cohorts)), (row[-3] - since).days, moods.setdefault(row[-2], len(moods)), row[-1])
+                for row in chunk
+            ],
+            dtype=np.int64,
+        ))
+    data = np.concatenate(parts) if parts else np.zeros((0, 4), dtype=np.int64)
+    cells = (data[:, 0] * days + data[:, 1]) * len(moods) + data[:, 2]
+    cube = np.bincount(cells, weights=data[:, 3], minlength=len(cohorts) * days * len(moods))
+    return list(cohorts), list(moods), cube.reshape(len(cohorts), days, len(moods))
+
+
+def _cohort_sizes(since, until, group_by):
+    '''Students who logged a mood in the range, per cohort.'''
+    rollups = MoodRollup.objects.filter(bucket='day', period__gte=since, period__lte=until)
+    if not group_by:
+        return {(): rollups.aggregate(users=Count('user', distinct=True))['users']}
+    sizes = (
+        rollups.values_list(*[f'user__{field}' for field in group_by])
+        .annotate(users=Count('user', distinct=True))
+        .order_by()
+    )
+    return {row[:-1]: row[-1] for row in sizes}
+
+
+def _moving_average(cube):
+    '''Trailing WINDOW-day mean along the day axis (shorter at the start of the range).'''
+    days = cube.shape[1]
+    running = np.concatenate([np.zeros_like(cube[:, :1]), np.cumsum(cube, axis=1)], axis=1)
+    end = np.arange(1, days + 1)
+    start = np.maximum(end - WINDOW, 0)
+    return (running[:, end] - running[:, start]) / (end - start)[None, :, None]
+
+
+def _shares(counts):
+    totals = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(totals > 0, counts / totals, 0.0)
+
+
+def _round(values, digits=3):
+    return np.round(values, digits).tolist()
+
+
+def analyse(since, until, group_by=GROUP_FIELDS):
+    '''
+    Mood distribution, 7-day moving averages and week-over-week changes per cohort.
+
+    All cohorts are computed together on one array. Weeks are whole WINDOW-day
+    blocks counted back from `until`; a delta is the change in a mood's share
+    of entries (in percentage points) from the previous week.
+    '''
+    keys, moods, cube = _cube(since, until, group_by)
+    sizes = _cohort_sizes(since, until, group_by)
+    days = cube.shape[1]
+
+    totals = cube.sum(axis=1)
+    distribution = _shares(totals)
+    moving = _moving_average(cube)
+    weeks = days // WINDOW
+    weekly = cube[:, days - weeks * WINDOW:].reshape(len(keys), weeks, WINDOW, len(moods)).sum(axis=2)
+    deltas = np.diff(_shares(weekly), axis=1) * 100
+
+    cohorts, suppressed = [], 0
+    for i, key in enumerate(keys):
+        users = sizes.get(key, 0)
+        if users < MIN_COHORT_USERS:
+            suppressed += 1
+            continue
+        cohorts.append({
+            'cohort': dict(zip(group_by, key)),
+            'users': users,
+            'entries': int(totals[i].sum()),
+            'distribution': dict(zip(moods, _round(distribution[i]))),
+            'daily_entries': cube[i].sum(axis=1).astype(int).tolist(),
+            'moving_average': {mood: _round(moving[i, :, j], 2) for j, mood in enumerate(moods)},
+            'weekly_entries': weekly[i].sum(axis=1).astype(int).tolist(),
+            'week_over_week': {mood: _round(deltas[i, :, j], 1) for j, mood in enumerate(moods)},
+        })
+    cohorts.sort(key=lambda cohort: -cohort['entries'])
+
+    return {
+        'since': since,
+        'until': until,
+        'group_by': list(group_by),
+        'days': [since + datetime.timedelta(days=n) for n in range(days)],
+        'weeks': [since + datetime.timedelta(days=days - (weeks - n) * WINDOW) for n in range(weeks)],
+        'moods': moods,
+        'min_cohort_users': MIN_COHORT_USERS,
+        'suppressed_cohorts': suppressed,
+        'cohorts': cohorts,
+    }
+
+
+def cohort_analytics(since, until, group_by=GROUP_FIELDS):
+    '''analyse(), cached per time window and grouping for RESULT_TIMEOUT.'''
+    key = f'mood-cohorts:{since}:{until}:{"+".join(group_by)}'
+    result = cache.get(key)
+    if result is None:
+        result = analyse(since, until, group_by)
+        cache.set(key, result, RESULT_TIMEOUT)
+    return result
@@ -0,0 +1,76 @@
+import zlib
+from django import forms
+from django.db import models
+
+
+# -------------------------
+# Compressed Text
+# -------------------------
+
+# Stored values start with one of these markers
+PLAIN = b'\x00'
+ZLIB = b'\x01'
+
+
+class CompressedTextField(models.BinaryField):
+    '''
+    Text stored as bytes, zlib-compressed when that pays off.
+
+    Values at least `compress_min` bytes long (UTF-8) are compressed if that
+    makes them smaller; everything else is stored as is. Reads decompress
+    transparently, so the attribute is always a str. The column cannot be
+    searched or filtered by content in SQL.
+    '''
+    description = 'Text, compressed when large'
+
+    def __init__(self, *args, compress_min=512, level=6, **kwargs):
+        self.compress_min = compress_min
+        self.level = level
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.compress_min != 512:
+            kwargs['compress_min'] = self.compress_min
+        if self.level != 6:
+            kwargs['level'] = self.level
+        return name, path, args, kwargs
+
+    def encode(self, text):
+        raw = text.encode()
+        if len(raw) >= self.compress_min:
+            packed = zlib.compress(raw, self.level)
+            if len(packed) < len(raw):
+                return ZLIB + packed
+        return PLAIN + raw
+
+    def decode(self, stored):
+        stored = bytes(stored)
+        if not stored:
+            return ''
+        if stored[:1] == ZLIB:
+            return zlib.decompress(stored[1:]).decode()
+        return stored[1:].decode()
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else self.decode(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return self.decode(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return None if value is None else self.encode(str(value))
+
+    def get_default(self):
+        default = super().get_default()
+        return '' if default == b'' else default
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, form_class=forms.CharField, widget=forms.Textarea, **kwargs)
@@ -0,0 +1,13 @@
+import django_filters
+from .models import Transaction
+
+
+class TransactionFilter(django_filters.FilterSet):
+    # Relies on TransactionQuerySet.with_overdue() so the filter runs in SQL
+    overdue = django_filters.BooleanFilter(field_name='overdue')
+    # ?checkout_date_after=YYYY-MM-DD&checkout_date_before=YYYY-MM-DD
+    checkout_date = django_filters.DateFromToRangeFilter(field_name='checkout_date')
+
+    class Meta:
+        model = Transaction
+        fields = ['status', 'overdue', 'checkout_date']
@@ -0,0 +1,337 @@
+import datetime
+import logging
+import math
+import re
+import time
+import uuid
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import GradingJob, Question, Submission
+from . import caching, quizstats
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------
+# Quiz Grading
+# -------------------------
+
+PASS_MARK = 50
+
+
+# -------------------------
+# Answer Matchers
+# -------------------------
+
+# The shared cache holds answer keys as plain rule tuples; each process turns
+# them into matchers once (see compile_matchers and caching.get_answer_key).
+
+def fold(value):
+    '''Case-insensitive form of an answer with runs of whitespace collapsed.'''
+    return ' '.join(str(value).split()).casefold()
+
+
+class ExactMatcher:
+    '''The original rule: the answer must equal an accepted answer exactly.'''
+    __slots__ = ('answers',)
+
+    def __init__(self, answers):
+        self.answers = tuple(answers)
+
+    def __call__(self, answer):
+        return answer in self.answers
+
+
+class TextMatcher:
+    '''Ignores case, surrounding spaces and repeated inner spaces.'''
+    __slots__ = ('answers',)
+
+    def __init__(self, answers):
+        self.answers = frozenset(fold(a) for a in answers)
+
+    def __call__(self, answer):
+        return answer is not None and fold(answer) in self.answers
+
+
+class NumericMatcher:
+    '''Accepts any number within `tolerance` of an accepted value.'''
+    __slots__ = ('values', 'limit')
+
+    def __init__(self, answers, tolerance=None):
+        try:
+            self.values = tuple(float(a) for a in answers)
+        except ValueError:
+            raise ValueError('Numeric answers must be numbers')
+        tolerance = tolerance or 0.0
+        if not all(math.isfinite(v) for v in self.values + (tolerance,)) or tolerance < 0:
+            raise ValueError('Numeric answers and tolerance must be finite, tolerance non-negative')
+        # Slack for binary rounding, so 3.13 is within 0.01 of 3.14
+        self.limit = tolerance + 1e-9 * max([1.0, *map(abs, self.values)])
+
+    def __call__(self, answer):
+        try:
+            number = float(str(answer).strip())
+        except (TypeError, ValueError):
+            return False
+        return any(abs(number - value) <= self.limit for value in self.values)
+
+
+class RegexMatcher:
+    '''The whole (stripped) answer must match one of the patterns.'''
+    __slots__ = ('patterns',)
+
+    def __init__(self, answers):
+        self.patterns = tuple(re.compile(a) for a in answers)
+
+    def __call__(self, answer):
+        if answer is None:
+            return False
+        answer = str(answer).strip()
+        return any(pattern.fullmatch(answer) for pattern in self.patterns)
+
+
+MATCHERS = {
+    'exact': ExactMatcher,
+    'text': TextMatcher,
+    'numeric': NumericMatcher,
+    'regex': RegexMatcher,
+}
+
+
+def compile_matcher(match_type, correct_answer, accepted_answers=(), tolerance=None):
+    '''Build the matcher for one question; raises ValueError if the rule is invalid.'''
+    answers = [correct_answer, *(accepted_answers or ())]
+    try:
+        if match_type == 'numeric':
+            return NumericMatcher(answers, tolerance)
+        return MATCHERS[match_type](answers)
+    except KeyError:
+        raise ValueError(f'Unknown match type: {match_type}')
+    except re.error as e:
+        raise ValueError(f'Invalid pattern: {e}')
+    except TypeError:
+        raise ValueError('Numeric answers must be numbers')
+
+
+def _matcher(correct_answer, rule):
+    if rule is None:
+        return None
+    try:
+        return compile_matcher(rule[0], correct_answer, rule[1], rule[2])
+    except ValueError:
+        # Rules are validated by the API, but the admin can still save a bad
+        # one; grade it the old way rather than failing every submission
+        return ExactMatcher([correct_answer])
+
+
+def compile_answer_key(quiz_id):
+    '''
+    (question_id, text, correct_answer, rule) for every question in the quiz, in a stable order.
+
+    `rule` is None for plain exact matching, otherwise
+    (match_type, accepted_answers, tolerance). Only plain values, so it is
+    cheap to store in the shared cache.
+    '''
+    rows = (
+        Question.objects.filter(quiz_id=quiz_id)
+        .order_by('pk')
+        .values_list('pk', 'text', 'correct_answer', 'match_type', 'accepted_answers', 'tolerance')
+    )
+    key = []
+    for pk, text, correct_answer, match_type, accepted, tolerance in rows:
+        rule = None if match_type == 'exact' and not accepted else (match_type, tuple(accepted or ()), tolerance)
+        key.append((pk, text, correct_answer, rule))
+    return tuple(key)
+
+
+def compile_matchers(key):
+    '''Swap each rule in a compiled answer key for its matcher (None: compare with ==).'''
+    return tuple((pk, text, correct_answer, _matcher(correct_answer, rule)) for pk, text, correct_answer, rule in key)
+
+
+def answer_key(quiz_id):
+    '''
+    Answer key with matchers, built once per quiz and dropped when a question changes.
+
+    Entries are (question_id, text, correct_answer, matcher); matcher is None
+    for plain exact matching.
+    '''
+    return caching.get_answer_key(quiz_id, lambda: compile_answer_key(quiz_id), compile_matchers)
+
+
+def select(key, question_ids):
+    '''The entries of an answer key for `question_ids`, in that order; ids no longer in the quiz are skipped.'''
+    by_id = {entry[0]: entry for entry in key}
+    return tuple(by_id[question_id] for question_id in question_ids if question_id in by_id)
+
+
+def pack_bits(flags):
+    '''Pack booleans into bytes, first flag in the high bit (numpy.packbits order).'''
+    value = 0
+    for flag in flags:
+        value = value << 1 | bool(flag)
+    size = (len(flags) + 7) // 8
+    return (value << (size * 8 - len(flags))).to_bytes(size, 'big')
+
+
+def unpack_bits(data, count):
+    '''Inverse of pack_bits: the first `count` flags stored in `data`.'''
+    data = bytes(data)
+    return [bool(data[i // 8] >> (7 - i % 8) & 1) for i in range(count)]
+
+
+def grade(answers, key):
+    '''
+    Compare a student's answers with an answer key; returns Submission field values.
+
+    Only which questions were graded and a bitmap of the correct ones are
+    kept; `feedback()` rebuilds the per-question view from them on demand.
+    '''
+    answers = answers or {}
+    flags = []
+    for question_id, _, correct_answer, matches in key:
+        answer = answers.get(str(question_id))
+        flags.append(answer == correct_answer if matches is None else matches(answer))
+    correct = sum(flags)
+    total = len(key)
+    percentage = round((correct / total) * 100) if total > 0 else 0
+    return {
+        'score': correct,
+        'percentage': percentage,
+        'status': 'pass' if percentage >= PASS_MARK else 'fail',
+        'question_ids': [question_id for question_id, _, _, _ in key],
+        'correctness': pack_bits(flags),
+    }
+
+
+def feedback(submission):
+    '''
+    Per-question feedback for a graded submission, rebuilt from the quiz.
+
+    Question text and correct answers come from the current answer key;
+    questions deleted since grading are reported with those left as None.
+    '''
+    if submission.status == 'pending':
+        return []
+    key = {question_id: (text, correct_answer) for question_id, text, correct_answer, _ in answer_key(submission.quiz_id)}
+    answers = submission.answers or {}
+    flags = unpack_bits(submission.correctness, len(submission.question_ids))
+    return [
+        {
+            'question_id': question_id,
+            'question': key.get(question_id, (None, None))[0],
+            'your_answer': answers.get(str(question_id)),
+            'correct_answer': key.get(question_id, (None, None))[1],
+            'is_correct': is_correct,
+        }
+        for question_id, is_correct in zip(submission.question_ids, flags)
+    ]
+
+
+# -------------------------
+# Asynchronous Grading Queue
+# -------------------------
+
+# A claimed job whose worker has not finished after this long is handed out again
+CLAIM_TIMEOUT = datetime.timedelta(minutes=5)
+
+# A job claimed this many times without being graded is marked failed and no longer handed out
+MAX_ATTEMPTS = 3
+
+
+def enqueue(submission):
+    '''Queue a pending submission for the grading workers.'''
+    return GradingJob.objects.create(submission=submission)
+
+
+def claim_jobs(batch_size):
+    '''
+    Claim up to `batch_size` jobs for this worker; returns (claim token, submissions).
+
+    Jobs are stamped with a fresh token in one UPDATE and read back by that
+    token, so two workers can never grade the same submission, even on
+    databases without SELECT ... FOR UPDATE SKIP LOCKED.
+    '''
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    claimable = Q(failed_at__isnull=True) & (Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - CLAIM_TIMEOUT))
+    # Jobs that keep failing (or killing their worker) stop here instead of going round forever
+    GradingJob.objects.filter(claimable, attempts__gte=MAX_ATTEMPTS).update(failed_at=now)
+    claimable &= Q(attempts__lt=MAX_ATTEMPTS)
+    with transaction.atomic():
+        ids = list(
+            GradingJob.objects.filter(claimable)
+            .select_for_update(skip_locked=True)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        GradingJob.objects.filter(claimable, pk__in=ids).update(
+            claim_token=token, claimed_at=now, attempts=F('attempts') + 1,
+        )
+    return token, list(Submission.objects.filter(grading_job__claim_token=token))
+
+
+def grade_submissions(submissions):
+    '''
+    Grade already-saved submissions in memory and write them back in one bulk UPDATE.
+
+    A submission that cannot be graded is logged and left out, so it does not
+    hold up the rest of its batch. Returns the graded submissions.
+    '''
+    graded = []
+    for submission in submissions:
+        key = answer_key(submission.quiz_id)
+        # Set up front when the questions were drawn from a bank
+        if submission.question_ids:
+            key = select(key, submission.question_ids)
+        try:
+            result = grade(submission.answers, key)
+        except Exception:
+            logger.exception('Could not grade submission %s', submission.pk)
+            continue
+        for field, value in result.items():
+            setattr(submission, field, value)
+        graded.append(submission)
+    Submission.objects.bulk_update(graded, ['score', 'percentage', 'status', 'question_ids', 'correctness'])
+    return graded
+
+
+def finish_jobs(token, submissions):
+    '''
+    Grade, count and retire the claimed submissions whose jobs `token` still holds.
+
+    A job that outlived CLAIM_TIMEOUT may have been handed to another worker,
+    which then grades and counts it; those are skipped here so quiz stats are
+    not counted twice. Returns how many were graded.
+    '''
+    with transaction.atomic():
+        owned = set(
+            GradingJob.objects.filter(claim_token=token)
+            .select_for_update()
+            .values_list('submission_id', flat=True)
+        )
+        submissions = grade_submissions([submission for submission in submissions if submission.pk in owned])
+        if submissions:
+            quizstats.record(submissions)
+            # Jobs that failed stay claimed, to be retried after CLAIM_TIMEOUT up to MAX_ATTEMPTS times
+            GradingJob.objects.filter(claim_token=token, submission__in=submissions).delete()
+    return len(submissions)
+
+
+def grade_pending(batch_size=100):
+    '''Claim, grade and retire one batch of queued submissions; returns how many were graded.'''
+    token, submissions = claim_jobs(batch_size)
+    if not submissions:
+        return 0
+    return finish_jobs(token, submissions)
+
+
+def wait_for_result(submission_id, timeout, interval=0.25):
+    '''Long-poll helper: the submission once graded, or still pending after `timeout` seconds.'''
+    deadline = time.monotonic() + timeout
+    while True:
+        submission = Submission.objects.get(pk=submission_id)
+        if submission.status != 'pending' or time.monotonic() >= deadline:
+            return submission
+        time.sleep(interval)
@@ -0,0 +1,135 @@
+from collections import defaultdict
+import numpy as np
+from django.db.models import Count, Max
+from .models import Submission
+from . import grading
+
+
+# -------------------------
+# Item Analysis
+# -------------------------
+
+# Rows fetched per round trip while filling the correctness matrix
+CHUNK_SIZE = 5000
+
+
+def correctness_matrix(quiz_id, chunk_size=CHUNK_SIZE):
+    '''
+    Load a quiz's graded submissions into (students x questions) boolean matrices.
+
+    Columns follow the quiz's current answer key. Rows are read in keyset
+    chunks, up to the newest submission that existed when the call started,
+    and each chunk's correctness bitmaps are unpacked in bulk per distinct
+    set of graded questions. `seen` marks the questions each submission was
+    graded on: questions not drawn from a bank, or added since, were never
+    put to the student and are neither correct nor incorrect.
+    Returns (question_ids, texts, matrix, seen).
+    '''
+    key = grading.answer_key(quiz_id)
+    question_ids = [question_id for question_id, _, _, _ in key]
+    texts = [text for _, text, _, _ in key]
+    column = {question_id: j for j, question_id in enumerate(question_ids)}
+
+    graded = Submission.objects.filter(quiz_id=quiz_id).exclude(status='pending').order_by('pk')
+    bounds = graded.aggregate(n=Count('pk'), last=Max('pk'))
+    matrix = np.zeros((bounds['n'], len(question_ids)), dtype=bool)
+    seen = np.zeros_like(matrix)
+
+    row, after = 0, 0
+    while row < bounds['n']:
+        chunk = list(
+            graded.filter(pk__gt=after, pk__lte=bounds['last'])
+            .values_list('pk', 'question_ids', 'correctness')[:min(chunk_size, bounds['n'] - row)]
+        )
+        if not chunk:
+            break
+        # Almost every row of a quiz shares one question set, so this is usually a single group
+        groups = defaultdict(list)
+        for i, (_, graded_ids, bitmap) in enumerate(chunk, start=row):
+            if graded_ids:
+                groups[tuple(graded_ids)].append((i, bytes(bitmap)))
+        for graded_ids, members in groups.items():
+            cols = np.array([column.get(question_id, -1) for question_id in graded_ids])
+            keep = cols >= 0
+            rows = np.array([i for i, _ in members])
+            packed = np.frombuffer(b''.join(bitmap for _, bitmap in members), dtype=np.uint8)
+            bits = np.unpackbits(packed.reshape(len(members), -1), axis=1, count=len(graded_ids)).astype(bool)
+            matrix[np.ix_(rows, cols[keep])] = bits[:, keep]
+            seen[np.ix_(rows, cols[keep])] = True
+        row += len(chunk)
+        after = chunk[-1][0]
+    return question_ids, texts, matrix[:row], seen[:row]
+
+
+def _point_biserial(matrix, seen, totals):
+    '''
+    Correlation of each item with the rest-of-test score (total minus that item),
+    over the students who were given the item; NaN where undefined.
+    '''
+    weights = seen.astype(np.float64)
+    items = matrix.astype(np.float64)
+    rest = totals[:, None] - items
+    with np.errstate(invalid='ignore', divide='ignore'):
+        counts = weights.sum(axis=0)
+        items_c = (items - (items * weights).sum(axis=0) / counts) * weights
+        rest_c = (rest - (rest * weights).sum(axis=0) / counts) * weights
+        cov = (items_c * rest_c).sum(axis=0)
+        spread = np.sqrt((items_c ** 2).sum(axis=0) * (rest_c ** 2).sum(axis=0))
+        return np.where(spread > 0, cov / spread, np.nan)
+
+
+def _rounded(value, digits=3):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def analyse(question_ids, texts, matrix, seen=None):
+    '''
+    Item difficulty, discrimination and the score distribution for a correctness matrix.
+
+    Item statistics only count the submissions `seen` marks as given each
+    question; by default every submission was given every question.
+    '''
+    students, questions = matrix.shape
+    if seen is None:
+        seen = np.ones_like(matrix, dtype=bool)
+    totals = matrix.sum(axis=1, dtype=np.int64)
+    presented = seen.sum(axis=0)
+
+    if students:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            difficulty = matrix.sum(axis=0) / presented
+        discrimination = _point_biserial(matrix, seen, totals)
+        quartiles = np.percentile(totals, [25, 50, 75])
+    else:
+        difficulty = discrimination = np.full(questions, np.nan)
+        quartiles = [None] * 3
+
+    return {
+        'submissions': students,
+        'questions': [
+            {
+                'question_id': question_id,
+                'question': text,
+                'presented': int(given),
+                'correct': int(correct),
+                # Proportion answering correctly: higher means easier
+                'difficulty': _rounded(p),
+                'discrimination': _rounded(r),
+            }
+            for question_id, text, given, correct, p, r in zip(
+                question_ids, texts, presented, matrix.sum(axis=0), difficulty, discrimination,
+            )
+        ],
+        'scores': {
+            'mean': _rounded(totals.mean()) if students else None,
+            'std': _rounded(totals.std()) if students else None,
+            'quartiles': [_rounded(q) for q in quartiles],
+            # distribution[k] = number of submissions with exactly k correct answers
+            'distribution': np.bincount(totals, minlength=questions + 1).tolist(),
+        },
+    }
+
+
+def item_analysis(quiz_id, chunk_size=CHUNK_SIZE):
+    '''Full item analysis for a quiz's graded submissions.'''
+    return analyse(*correctness_matrix(quiz_id, chunk_size))
@@ -0,0 +1,359 @@
+import csv
+import datetime
+import io
+import json
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from .models import Book, Transaction, User, generate_isbns
+from . import caching
+
+
+# -------------------------
+# Borrow / Return Engine
+# -------------------------
+
+class BorrowError(Exception):
+    '''Raised when a borrow or return cannot be applied.'''
+
+
+def _open_borrows(user):
+    return Transaction.objects.filter(user=user, return_date__isnull=True)
+
+
+def borrow_book(user, book_id):
+    '''
+    Borrow one copy of a book for a user.
+
+    Stock and the "already borrowed" check are applied in a single
+    conditional UPDATE, so concurrent borrowers can never oversell copies.
+    '''
+    try:
+        with transaction.atomic():
+            updated = (
+                Book.objects
+                .filter(pk=book_id, copies_available__gt=0)
+                .filter(~Exists(_open_borrows(user).filter(book=OuterRef('pk'))))
+                .update(copies_available=F('copies_available') - 1)
+            )
+            if updated:
+                caching.bump_books([book_id])
+                return Transaction.objects.create(user=user, book_id=book_id)
+    except IntegrityError:
+        # A parallel request for the same user and book won the race
+        raise BorrowError('You already borrowed this book')
+
+    # Only the failure path pays for finding out why
+    if _open_borrows(user).filter(book_id=book_id).exists():
+        raise BorrowError('You already borrowed this book')
+    raise BorrowError('No copies available')
+
+
+def return_book(user, book_id):
+    '''Close the user's open borrow of a book and put the copy back in stock.'''
+    with transaction.atomic():
+        updated = _open_borrows(user).filter(book_id=book_id).update(
+            return_date=timezone.now(),
+            status='returned',
+        )
+        if not updated:
+            raise BorrowError('No active borrow found')
+        Book.objects.filter(pk=book_id).update(copies_available=F('copies_available') + updated)
+        caching.bump_books([book_id])
+    return updated
+
+
+# -------------------------
+# Bulk (class-set) Borrow / Return
+# -------------------------
+
+def _adjust_stock(counts):
+    '''Apply per-book stock deltas ({book_id: delta}) in a single UPDATE.'''
+    if not counts:
+        return
+    delta = Case(
+        *[When(pk=book_id, then=Value(n)) for book_id, n in counts.items()],
+        default=Value(0),
+    )
+    Book.objects.filter(pk__in=counts).update(copies_available=F('copies_available') + delta)
+    caching.bump_books(counts)
+
+
+def _result(item, error=None):
+    return {'user': item['user'], 'book': item['book'], 'ok': error is None, 'error': error}
+
+
+def bulk_borrow(items):
+    '''
+    Borrow many (user, book) pairs at once.
+
+    Availability is validated for the whole batch in one pass against locked
+    book rows, then all transactions are bulk inserted and stock is adjusted
+    with one aggregated UPDATE. Returns one result per item, in order.
+    '''
+    user_ids = {item['user'] for item in items}
+    book_ids = {item['book'] for item in items}
+    results, loans, counts = [], [], {}
+
+    with transaction.atomic():
+        stock = dict(
+            Book.objects.select_for_update()
+            .filter(pk__in=book_ids)
+            .order_by('pk')
+            .values_list('pk', 'copies_available')
+        )
+        users = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+        held = set(
+            Transaction.objects
+            .filter(return_date__isnull=True, user_id__in=user_ids, book_id__in=book_ids)
+            .values_list('user_id', 'book_id')
+        )
+
+        for item in items:
+            pair = (item['user'], item['book'])
+            if item['user'] not in users:
+                results.append(_result(item, 'User not found'))
+            elif item['book'] not in stock:
+                results.append(_result(item, 'Book not found'))
+            elif pair in held:
+                results.append(_result(item, 'Already borrowed'))
+            elif stock[item['book']] < 1:
+                results.append(_result(item, 'No copies available'))
+            else:
+                held.add(pair)
+                stock[item['book']] -= 1
+                counts[item['book']] = counts.get(item['book'], 0) - 1
+                loans.append(Transaction(user_id=item['user'], book_id=item['book']))
+                results.append(_result(item))
+
+        Transaction.objects.bulk_create(loans)
+        _adjust_stock(counts)
+
+    return results
+
+
+def bulk_return(items):
+    '''Return many (user, book) pairs at once; the counterpart of bulk_borrow.'''
+    user_ids = {item['user'] for item in items}
+    book_ids = {item['book'] for item in items}
+    results, closing, counts = [], [], {}
+
+    with transaction.atomic():
+        open_loans = {
+            (user_id, book_id): pk
+            for pk, user_id, book_id in Transaction.objects.select_for_update()
+            .filter(return_date__isnull=True, user_id__in=user_ids, book_id__in=book_ids)
+            .order_by('pk')
+            .values_list('pk', 'user_id', 'book_id')
+        }
+
+        for item in items:
+            pk = open_loans.pop((item['user'], item['book']), None)
+            if pk is None:
+                results.append(_result(item, 'No active borrow found'))
+                continue
+            closing.append(pk)
+            counts[item['book']] = counts.get(item['book'], 0) + 1
+            results.append(_result(item))
+
+        Transaction.objects.filter(pk__in=closing).update(
+            return_date=timezone.now(),
+            status='returned',
+        )
+        _adjust_stock(counts)
+
+    return results
+
+
+def return_transactions(queryset):
+    '''
+    Return every open borrow in a Transaction queryset.
+
+    One UPDATE closes the transactions and one aggregated UPDATE puts the
+    copies back, so concurrent returns of the same book cannot lose increments.
+    '''
+    with transaction.atomic():
+        loans = list(
+            queryset.filter(return_date__isnull=True)
+            .select_for_update()
+            .order_by('pk')
+            .values_list('pk', 'book_id')
+        )
+        if not loans:
+            return 0
+        counts = {}
+        for _, book_id in loans:
+            counts[book_id] = counts.get(book_id, 0) + 1
+        Transaction.objects.filter(pk__in=[pk for pk, _ in loans]).update(
+            return_date=timezone.now(),
+            status='returned',
+        )
+        _adjust_stock(counts)
+    return len(loans)
+
+
+def recompute_copies_available(queryset=None):
+    '''
+    Reset copies_available to total_copies minus open borrows, in one UPDATE.
+
+    Books whose total is unknown are left alone. Returns the number of books updated.
+    '''
+    queryset = (Book.objects.all() if queryset is None else queryset).filter(total_copies__isnull=False)
+    open_loans = (
+        Transaction.objects
+        .filter(book=OuterRef('pk'), return_date__isnull=True)
+        .order_by()
+        .values('book')
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    with transaction.atomic():
+        updated = queryset.update(
+            copies_available=Greatest(F('total_copies') - Coalesce(Subquery(open_loans), 0), 0)
+        )
+        caching.bump_books(list(queryset.values_list('pk', flat=True)))
+    return updated
+
+
+# -------------------------
+# Overdue Sweeper
+# -------------------------
+
+def mark_overdue(chunk_size=1000, now=None):
+    '''
+    Flag open, past-due borrows as 'overdue'.
+
+    Each chunk is a single UPDATE ... WHERE id IN (SELECT ... LIMIT n), served by
+    the (return_date, due_date) index, so the sweep never holds locks on the
+    whole table. Returns the number of rows updated.
+    '''
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1')
+    now = now or timezone.now()
+    due = Transaction.objects.past_due(now).filter(status='borrowed').order_by()
+    total = 0
+    while True:
+        with transaction.atomic():
+            updated = Transaction.objects.filter(
+                pk__in=due.values('pk')[:chunk_size]
+            ).update(status='overdue')
+        total += updated
+        if updated < chunk_size:
+            return total
+
+
+# -------------------------
+# Catalogue Import
+# -------------------------
+
+# Written on update; copies_available is recomputed from total_copies and the open loans instead
+IMPORT_FIELDS = ['title', 'author', 'published_date', 'total_copies', 'genre', 'summary']
+
+
+def _read_rows(stream, fmt):
+    '''Yield (line_number, dict) pairs one at a time from a CSV or JSONL stream.'''
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError:
+                    yield line_number, None
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+
+def _clean_row(row):
+    '''Validate one import row; returns (Book, None) or (None, error message).'''
+    if not isinstance(row, dict):
+        return None, 'Malformed row'
+    title = (row.get('title') or '').strip()
+    author = (row.get('author') or '').strip()
+    if not title or not author:
+        return None, 'title and author are required'
+    try:
+        published_date = datetime.date.fromisoformat(str(row.get('published_date') or '').strip())
+    except ValueError:
+        return None, 'published_date must be YYYY-MM-DD'
+    raw_copies = row.get('copies_available')
+    try:
+        copies = 1 if raw_copies is None or str(raw_copies).strip() == '' else int(raw_copies)
+    except (TypeError, ValueError):
+        copies = -1
+    if copies < 0:
+        return None, 'copies_available must be a non-negative integer'
+    isbn = str(row.get('isbn') or '').strip().replace('-', '')
+    if isbn and (len(isbn) > 13 or not isbn.isdigit()):
+        return None, 'isbn must be at most 13 digits'
+    return Book(
+        title=title[:200],
+        author=author[:200],
+        isbn=isbn,
+        published_date=published_date,
+        copies_available=copies,
+        total_copies=copies,
+        genre=(row.get('genre') or '').strip() or None,
+        summary=(row.get('summary') or '').strip() or None,
+    ), None
+
+
+def _write_batch(books):
+    '''Upsert one batch on ISBN; returns (created, updated).'''
+    # Later rows win when a batch repeats an ISBN
+    by_isbn = {book.isbn: book for book in books if book.isbn}
+    fresh = [book for book in books if not book.isbn]
+    for book, isbn in zip(fresh, generate_isbns(len(fresh))):
+        book.isbn = isbn
+
+    with transaction.atomic():
+        existing = list(Book.objects.filter(isbn__in=by_isbn).values_list('pk', flat=True))
+        Book.objects.bulk_create(
+            list(by_isbn.values()) + fresh,
+            update_conflicts=True,
+            unique_fields=['isbn'],
+            update_fields=IMPORT_FIELDS,
+        )
+        if existing:
+            # Copies out on loan stay out, whatever stock the file lists
+            recompute_copies_available(Book.objects.filter(pk__in=existing))
+        # New books change the list pages even when no cached book is updated
+        caching.bump_books(existing)
+    return len(by_isbn) + len(fresh) - len(existing), len(existing)
+
+
+def import_books(stream, fmt='csv', batch_size=1000, max_errors=100):
+    '''
+    Stream a CSV or JSONL catalogue into Book in batched upserts keyed on ISBN.
+
+    Rows without an ISBN get one from the collision-free sequence. Memory use
+    is bounded by `batch_size`, not by the size of the file.
+    '''
+    report = {'created': 0, 'updated': 0, 'skipped': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        created, updated = _write_batch(batch)
+        report['created'] += created
+        report['updated'] += updated
+        batch.clear()
+
+    for line_number, row in _read_rows(stream, fmt):
+        book, error = _clean_row(row)
+        if error:
+            report['skipped'] += 1
+            if len(report['errors']) < max_errors:
+                report['errors'].append({'line': line_number, 'error': error})
+            continue
+        batch.append(book)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report
@@ -0,0 +1,91 @@
+import itertools
+import random
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from core.models import Book
+from core.search import search_books
+
+GENRES = ['Novel', 'Science', 'History', 'Poetry', 'Biography', 'Mathematics']
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'tu', 'ne', 'so', 'vi', 'da', 'pe', 'zu', 'ba']
+
+
+def vocabulary(rng, size=20_000):
+    '''Synthetic words with Zipf-like frequencies, like a real catalogue.'''
+    words = sorted({''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size * 2)})
+    rng.shuffle(words)
+    words = words[:size]
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    return words, weights
+
+
+class Command(BaseCommand):
+    help = 'Load synthetic books into a scratch database and compare indexed search with a LIKE scan.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1_000_000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated books afterwards.')
+        parser.add_argument(
+            '--scratch', action='store_true',
+            help='Confirm that the configured database is a scratch database that may be loaded with test rows.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['scratch']:
+            raise CommandError(
+                f'This loads {options["books"]} books into {connection.settings_dict["NAME"]}; '
+                'point DATABASE_URL at a scratch database and pass --scratch'
+            )
+        if options['books'] > 10_000_000:
+            raise CommandError('At most 10,000,000 books per run')
+        rng = random.Random(42)
+        words, weights = vocabulary(rng)
+        cum_weights = list(itertools.accumulate(weights))
+        pick = lambda k: rng.choices(words, cum_weights=cum_weights, k=k)
+        # A common, a mid-frequency, a rare and a two-term query
+        queries = [words[5], words[500], words[10_000], f'{words[50]} {words[300]}']
+        # Generated ISBNs start with a letter, so they never clash with real ones, and carry a per-run tag
+        prefix = f'b{uuid.uuid4().hex[:5]}'
+        start = time.perf_counter()
+        for offset in range(0, options['books'], options['batch_size']):
+            count = min(options['batch_size'], options['books'] - offset)
+            Book.objects.bulk_create(
+                Book(
+                    title=' '.join(pick(3)).title(),
+                    author=f'Author {rng.randrange(50_000)}',
+                    isbn=f'{prefix}{offset + n:07d}',
+                    published_date='2000-01-01',
+                    genre=rng.choice(GENRES),
+                    summary=' '.join(pick(25)),
+                )
+                for n in range(count)
+            )
+        self.stdout.write(f'Loaded {options["books"]} books in {time.perf_counter() - start:.1f}s')
+
+        books = Book.objects.all()
+        try:
+            for q in queries:
+                indexed = self._time(lambda: list(search_books(books, q)[:10]))
+                like = books.filter(Q(title__icontains=q) | Q(author__icontains=q) | Q(summary__icontains=q))
+                scan = self._time(lambda: list(like.order_by('title')[:10]), repeat=1)
+                counted = self._time(lambda: search_books(books, q).count())
+                scan_counted = self._time(lambda: like.count(), repeat=1)
+                # Paginated list responses need both the page and the COUNT
+                self.stdout.write(
+                    f'q={q!r:24} page indexed={indexed * 1000:7.1f}ms LIKE={scan * 1000:7.1f}ms | '
+                    f'count indexed={counted * 1000:7.1f}ms LIKE={scan_counted * 1000:7.1f}ms'
+                )
+        finally:
+            if not options['keep']:
+                Book.objects.filter(isbn__startswith=prefix).delete()
+
+    def _time(self, fn, repeat=3):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
@@ -0,0 +1,68 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from core.models import Book, Transaction, User
+from core import library
+
+
+class Command(BaseCommand):
+    help = 'Stress the borrow engine with parallel borrowers against one book and report throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--borrowers', type=int, default=500)
+        parser.add_argument('--copies', type=int, default=250)
+        parser.add_argument('--workers', type=int, default=16)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        book = Book.objects.create(
+            title=f'bench-{tag}', author='bench', isbn=tag.rjust(13, '0'),
+            published_date='2025-01-01', copies_available=options['copies'],
+        )
+        User.objects.bulk_create(
+            User(username=f'bench-{tag}-{n}', email=f'bench-{tag}-{n}@example.com', role='student')
+            for n in range(options['borrowers'])
+        )
+        students = list(User.objects.filter(username__startswith=f'bench-{tag}-'))
+        retries = []
+
+        def borrow(student):
+            try:
+                while True:
+                    try:
+                        library.borrow_book(student, book.pk)
+                        return True
+                    except library.BorrowError:
+                        return False
+                    except OperationalError:
+                        retries.append(1)
+            finally:
+                connection.close()
+
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                results = list(pool.map(borrow, students))
+            elapsed = time.perf_counter() - start
+
+            book.refresh_from_db()
+            borrowed = results.count(True)
+            rows = Transaction.objects.filter(book=book).count()
+            self.stdout.write(
+                f'{len(students)} borrow attempts in {elapsed:.2f}s '
+                f'({len(students) / elapsed:.0f}/s) with {options["workers"]} workers, '
+                f'{len(retries)} lock retries'
+            )
+            self.stdout.write(
+                f'borrowed={borrowed} transactions={rows} '
+                f'copies_left={book.copies_available} of {options["copies"]}'
+            )
+            if borrowed != rows or borrowed + book.copies_available != options['copies']:
+                self.stderr.write(self.style.ERROR('Stock drifted: copies were oversold'))
+            else:
+                self.stdout.write(self.style.SUCCESS('No oversell'))
+        finally:
+            book.delete()
+            User.objects.filter(username__startswith=f'bench-{tag}-').delete()
@@ -0,0 +1,113 @@
+import io
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core.models import GradingJob, Question, Quiz, Submission, User
+from core.views import SubmissionViewSet
+
+
+def legacy_grade(submission):
+    '''The grading path SubmissionViewSet used before compiled answer keys, for comparison.'''
+    quiz = submission.quiz
+    answers = submission.answers or {}
+    correct = 0
+    total = quiz.questions.count()
+    feedback = []
+    for question in quiz.questions.all():
+        answer = answers.get(str(question.id))
+        is_correct = answer == question.correct_answer
+        correct += is_correct
+        feedback.append({'question_id': question.id, 'question': question.text, 'your_answer': answer,
+                         'correct_answer': question.correct_answer, 'is_correct': is_correct})
+    submission.score = correct
+    submission.percentage = round((correct / total) * 100) if total else 0
+    submission.status = 'pass' if submission.percentage >= 50 else 'fail'
+    submission.feedback = feedback
+    submission.save()
+
+
+class Command(BaseCommand):
+    help = 'Submit many answer sheets to one quiz in parallel and report grading throughput.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=1000)
+        parser.add_argument('--questions', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--queue-workers', default='1,2,4,8',
+                            help='Comma-separated run_grading_workers pool sizes to drain the queue with.')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        rng = random.Random(7)
+        User.objects.bulk_create(
+            User(username=f'bench-{tag}-{n}', email=f'bench-{tag}-{n}@example.com', role='student')
+            for n in range(options['submissions'])
+        )
+        students = list(User.objects.filter(username__startswith=f'bench-{tag}-'))
+        quiz = Quiz.objects.create(title=f'bench-{tag}', created_by=students[0], duration=0)
+        for n in range(options['questions']):
+            Question.objects.create(quiz=quiz, text=f'Question {n} ' + 'lorem ipsum ' * 10, correct_answer=str(n))
+        key = list(quiz.questions.values_list('pk', 'correct_answer'))
+        sheets = [
+            {str(pk): answer if rng.random() < 0.7 else 'wrong' for pk, answer in key}
+            for _ in students
+        ]
+        view = SubmissionViewSet.as_view({'post': 'create'})
+        factory = APIRequestFactory()
+
+        def submit_current(args):
+            student, sheet = args
+            request = factory.post('/api/submissions/', {'quiz': quiz.pk, 'answers': sheet}, format='json')
+            force_authenticate(request, user=student)
+            try:
+                return view(request).status_code
+            finally:
+                connection.close()
+
+        def submit_legacy(args):
+            student, sheet = args
+            try:
+                legacy_grade(Submission.objects.create(user=student, quiz=quiz, answers=sheet))
+                return 201
+            finally:
+                connection.close()
+
+        try:
+            for label, submit in (('legacy', submit_legacy), ('compiled key', submit_current)):
+                Submission.objects.filter(quiz=quiz).delete()
+                submit((students[0], sheets[0]))  # warm-up, builds the answer key
+                with CaptureQueriesContext(connection) as queries:
+                    submit((students[1], sheets[1]))
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                    codes = list(pool.map(submit, zip(students[2:], sheets[2:])))
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f'{label:13} {len(codes)} submissions in {elapsed:.2f}s ({len(codes) / elapsed:.0f}/s), '
+                    f'{len(queries)} queries per submission, '
+                    f'{codes.count(201)} accepted'
+                )
+            for workers in map(int, options['queue_workers'].split(',')):
+                Submission.objects.filter(quiz=quiz).delete()
+                queued = Submission.objects.bulk_create(
+                    Submission(user=student, quiz=quiz, answers=sheet, status='pending')
+                    for student, sheet in zip(students, sheets)
+                )
+                GradingJob.objects.bulk_create(GradingJob(submission=submission) for submission in queued)
+                start = time.perf_counter()
+                call_command('run_grading_workers', workers=workers, drain=True, stdout=io.StringIO())
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f'queue, {workers} worker{"s" if workers > 1 else " "} {len(queued)} submissions in {elapsed:.2f}s '
+                    f'({len(queued) / elapsed:.0f}/s)'
+                )
+        finally:
+            quiz.delete()
+            User.objects.filter(username__startswith=f'bench-{tag}-').delete()
+            reset_queries()
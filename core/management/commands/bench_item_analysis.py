@@ -0,0 +1,46 @@
+import random
+import time
+import uuid
+from django.core.management.base import BaseCommand
+from core import grading, itemanalysis
+from core.models import Question, Quiz, Submission, User
+
+
+class Command(BaseCommand):
+    help = 'Time item analysis over a synthetic quiz with many graded submissions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=100_000)
+        parser.add_argument('--questions', type=int, default=20)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        rng = random.Random(7)
+        student = User.objects.create(username=f'bench-{tag}', email=f'bench-{tag}@example.com', role='student')
+        quiz = Quiz.objects.create(title=f'bench-{tag}', created_by=student)
+        Question.objects.bulk_create(
+            Question(quiz=quiz, text=f'Question {n}', correct_answer=str(n)) for n in range(options['questions'])
+        )
+        key = grading.compile_matchers(grading.compile_answer_key(quiz.pk))
+        # Students of varying ability, so items discriminate
+        for start in range(0, options['submissions'], 5000):
+            batch = []
+            for _ in range(min(5000, options['submissions'] - start)):
+                ability = rng.random()
+                answers = {str(pk): answer if rng.random() < ability else '?' for pk, _, answer, _ in key}
+                batch.append(Submission(user=student, quiz=quiz, **grading.grade(answers, key)))
+            Submission.objects.bulk_create(batch)
+
+        try:
+            started = time.perf_counter()
+            question_ids, texts, matrix, seen = itemanalysis.correctness_matrix(quiz.pk)
+            loaded = time.perf_counter()
+            result = itemanalysis.analyse(question_ids, texts, matrix, seen)
+            finished = time.perf_counter()
+            self.stdout.write(
+                f'{result["submissions"]} submissions x {len(question_ids)} questions: '
+                f'load {loaded - started:.2f}s, analyse {(finished - loaded) * 1000:.1f}ms'
+            )
+        finally:
+            quiz.delete()
+            student.delete()
@@ -0,0 +1,27 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from core import library
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSONL catalogue into the library, upserting on ISBN.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError('Pass --format csv or --format jsonl')
+
+        with open(path, newline='', encoding='utf-8-sig') as stream:
+            report = library.import_books(stream, fmt, batch_size=options['batch_size'])
+
+        for error in report['errors']:
+            self.stderr.write(f'line {error["line"]}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{report["created"]} created, {report["updated"]} updated, {report["skipped"]} skipped'
+        ))
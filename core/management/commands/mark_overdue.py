@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import library
+
+
+class Command(BaseCommand):
+    help = "Mark open, past-due transactions as 'overdue'. Safe to schedule (e.g. hourly via cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        updated = library.mark_overdue(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'{updated} transactions marked as overdue'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core import moodstats
+
+
+class Command(BaseCommand):
+    help = 'Recompute mood rollups from moods (repairs drift after bulk or raw SQL edits).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='Only rebuild these users.')
+
+    def handle(self, *args, **options):
+        written = moodstats.rebuild(options['user_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'{written} mood rollups written'))
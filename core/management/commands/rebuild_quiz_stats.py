@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core import quizstats
+
+
+class Command(BaseCommand):
+    help = 'Recompute quiz stats and leaderboards from submissions (repairs drift after deletes or manual edits).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_ids', nargs='*', type=int, help='Only rebuild these quizzes.')
+
+    def handle(self, *args, **options):
+        rebuilt = quizstats.rebuild(options['quiz_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Stats rebuilt for {rebuilt} quizzes'))
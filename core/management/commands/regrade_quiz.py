@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import regrade
+from core.models import Quiz, RegradeRun
+
+
+class Command(BaseCommand):
+    help = "Regrade a quiz's past submissions against its current answer key, resuming any unfinished run."
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('--chunk-size', type=int, default=regrade.CHUNK_SIZE)
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Worker processes (default: REGRADE_PROCESSES setting, 0 = one per CPU).')
+
+    def handle(self, *args, **options):
+        quiz_id = options['quiz_id']
+        if not Quiz.objects.filter(pk=quiz_id).exists():
+            raise CommandError(f'Quiz {quiz_id} does not exist')
+
+        run = regrade.claim_run(quiz_id, include_failed=True)
+        if run is None:
+            if RegradeRun.objects.filter(quiz_id=quiz_id, status='running').exists():
+                raise CommandError(f'A worker is already regrading quiz {quiz_id}')
+            RegradeRun.objects.create(quiz_id=quiz_id)
+            run = regrade.claim_run(quiz_id)
+            if run is None:
+                raise CommandError(f'A worker picked up the regrade of quiz {quiz_id} first')
+        elif run.cursor:
+            self.stdout.write(f'Resuming run {run.pk} after submission {run.cursor}')
+
+        def progress(run):
+            self.stdout.write(f'{run.processed}/{run.total} submissions, {run.changed} changed')
+
+        run = regrade.execute(
+            run, options['chunk_size'], options['processes'] or regrade.default_processes(), progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Run {run.pk} done: {run.processed} submissions regraded, {run.changed} changed'
+        ))
@@ -0,0 +1,62 @@
+import logging
+import signal
+import threading
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core import grading, regrade
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run a local pool of grading workers that drain the submission queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--regrade-processes', type=int, default=None,
+                            help='Processes per regrade (default: REGRADE_PROCESSES setting).')
+        parser.add_argument('--drain', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        totals = []
+
+        def batch():
+            # New submissions first, then any queued regrade after an answer key change
+            return grading.grade_pending(options['batch_size']) or regrade.process_next(
+                processes=options['regrade_processes'],
+            )
+
+        def work():
+            try:
+                graded = 0
+                while not stop.is_set():
+                    try:
+                        count = batch()
+                    except Exception:
+                        # Keep the worker alive; the batch's jobs are retried after CLAIM_TIMEOUT
+                        logger.exception('Grading batch failed')
+                        connection.close()
+                        stop.wait(1)
+                        continue
+                    graded += count
+                    if not count:
+                        if options['drain']:
+                            break
+                        stop.wait(0.5)
+                totals.append(graded)
+            finally:
+                connection.close()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+
+        threads = [threading.Thread(target=work, daemon=True) for _ in range(options['workers'])]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f'{len(threads)} grading workers started')
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+        self.stdout.write(self.style.SUCCESS(f'{sum(totals)} submissions graded or regraded'))
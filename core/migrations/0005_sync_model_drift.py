@@ -0,0 +1,44 @@
+# Generated by Django 6.0 on 2026-10-18 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_quiz_description_quiz_duration_quiz_subject_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumpost',
+            name='tags',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='mentorshiprequest',
+            name='message',
+            field=models.TextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='answers',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='feedback',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='percentage',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='status',
+            field=models.CharField(choices=[('pass', 'Pass'), ('fail', 'Fail'), ('pending', 'Pending')], default='pending', max_length=10),
+        ),
+    ]
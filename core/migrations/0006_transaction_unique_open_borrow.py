@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-18 09:53
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+
+def close_duplicate_borrows(apps, schema_editor):
+    '''
+    Keep only the oldest open borrow per user and book, so the constraint can be added.
+
+    Borrowing used to allow the same user to take the same book twice; the
+    later borrows are closed as returned and their copies put back in stock.
+    '''
+    Book = apps.get_model('core', 'Book')
+    Transaction = apps.get_model('core', 'Transaction')
+    duplicated = (
+        Transaction.objects.filter(return_date__isnull=True)
+        .values('user', 'book')
+        .annotate(n=Count('pk'), keep=Min('pk'))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    now = timezone.now()
+    for group in duplicated:
+        closed = (
+            Transaction.objects
+            .filter(user=group['user'], book=group['book'], return_date__isnull=True)
+            .exclude(pk=group['keep'])
+            .update(return_date=now, status='returned')
+        )
+        Book.objects.filter(pk=group['book']).update(copies_available=F('copies_available') + closed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_sync_model_drift'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_borrows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('return_date__isnull', True)), fields=('user', 'book'), name='unique_open_borrow'),
+        ),
+    ]
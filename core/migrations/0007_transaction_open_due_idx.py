@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 09:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_transaction_unique_open_borrow'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['return_date', 'due_date'], name='transaction_open_due_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 6.0 on 2026-10-18 10:05
+
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_book_fts USING fts5(
+        title, author, genre, summary,
+        content='core_book', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER core_book_fts_ai AFTER INSERT ON core_book BEGIN
+        INSERT INTO core_book_fts(rowid, title, author, genre, summary)
+        VALUES (new.id, new.title, new.author, new.genre, new.summary);
+    END
+    """,
+    """
+    CREATE TRIGGER core_book_fts_ad AFTER DELETE ON core_book BEGIN
+        INSERT INTO core_book_fts(core_book_fts, rowid, title, author, genre, summary)
+        VALUES ('delete', old.id, old.title, old.author, old.genre, old.summary);
+    END
+    """,
+    """
+    CREATE TRIGGER core_book_fts_au AFTER UPDATE OF title, author, genre, summary ON core_book BEGIN
+        INSERT INTO core_book_fts(core_book_fts, rowid, title, author, genre, summary)
+        VALUES ('delete', old.id, old.title, old.author, old.genre, old.summary);
+        INSERT INTO core_book_fts(rowid, title, author, genre, summary)
+        VALUES (new.id, new.title, new.author, new.genre, new.summary);
+    END
+    """,
+    "INSERT INTO core_book_fts(core_book_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS core_book_fts_au',
+    'DROP TRIGGER IF EXISTS core_book_fts_ad',
+    'DROP TRIGGER IF EXISTS core_book_fts_ai',
+    'DROP TABLE IF EXISTS core_book_fts',
+]
+
+# Must stay identical to core.search.PG_BOOK_VECTOR for the planner to use it
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX core_book_search_idx ON core_book USING gin ((
+        setweight(to_tsvector('english', coalesce(core_book.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(core_book.author, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(core_book.genre, '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(core_book.summary, '')), 'D')
+    ))
+    """,
+]
+
+POSTGRES_REVERSE = ['DROP INDEX IF EXISTS core_book_search_idx']
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_transaction_open_due_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
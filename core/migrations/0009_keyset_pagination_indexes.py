@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='submission',
+            options={'ordering': ['-submitted_at']},
+        ),
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['-created_at'], name='forumpost_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['-submitted_at'], name='submission_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['user', '-submitted_at'], name='submission_user_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-checkout_date'], name='transaction_checkout_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', '-checkout_date'], name='transaction_user_checkout_idx'),
+        ),
+    ]
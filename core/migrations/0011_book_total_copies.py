@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-18 10:15
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_total_copies(apps, schema_editor):
+    '''Owned copies = copies on the shelf + copies currently out on loan.'''
+    Book = apps.get_model('core', 'Book')
+    Transaction = apps.get_model('core', 'Transaction')
+    open_loans = (
+        Transaction.objects
+        .filter(book=OuterRef('pk'), return_date__isnull=True)
+        .order_by()
+        .values('book')
+        .annotate(n=Count('pk'))
+        .values('n')
+    )
+    Book.objects.update(total_copies=F('copies_available') + Coalesce(Subquery(open_loans), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='total_copies',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        # Nullable so SQLite adds the column in place instead of rebuilding
+        # core_book, which would drop the full-text search triggers
+        migrations.RunPython(backfill_total_copies, migrations.RunPython.noop),
+    ]
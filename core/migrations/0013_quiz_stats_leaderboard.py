@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-18 10:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_gradingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizStats',
+            fields=[
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.quiz')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('passes', models.PositiveIntegerField(default=0)),
+                ('total_score', models.BigIntegerField(default=0)),
+                ('total_percentage', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('percentage', models.IntegerField()),
+                ('score', models.IntegerField()),
+                ('achieved_at', models.DateTimeField()),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard', to='core.quiz')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['quiz', '-percentage', 'achieved_at'],
+                'indexes': [models.Index(fields=['quiz', '-percentage', 'achieved_at'], name='leaderboard_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'user'), name='unique_leaderboard_entry')],
+            },
+        ),
+    ]
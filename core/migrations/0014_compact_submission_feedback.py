@@ -0,0 +1,84 @@
+# Generated by Django 6.0 on 2026-10-18 10:25
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def _pack_bits(flags):
+    # Frozen copy of core.grading.pack_bits
+    value = 0
+    for flag in flags:
+        value = value << 1 | bool(flag)
+    size = (len(flags) + 7) // 8
+    return (value << (size * 8 - len(flags))).to_bytes(size, 'big')
+
+
+def _batches(Submission, fields):
+    last = 0
+    while True:
+        batch = list(Submission.objects.filter(pk__gt=last).order_by('pk').only('pk', *fields)[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1].pk
+
+
+def compact_feedback(apps, schema_editor):
+    '''Reduce stored feedback to the graded question ids and a correctness bitmap.'''
+    Submission = apps.get_model('core', 'Submission')
+    for batch in _batches(Submission, ['feedback']):
+        for submission in batch:
+            items = [item for item in submission.feedback or [] if isinstance(item, dict)]
+            submission.question_ids = [item.get('question_id') for item in items]
+            submission.correctness = _pack_bits([item.get('is_correct') for item in items])
+        Submission.objects.bulk_update(batch, ['question_ids', 'correctness'])
+
+
+def expand_feedback(apps, schema_editor):
+    '''Rebuild full feedback from the bitmap and the current questions.'''
+    Submission = apps.get_model('core', 'Submission')
+    Question = apps.get_model('core', 'Question')
+    for batch in _batches(Submission, ['answers', 'question_ids', 'correctness']):
+        ids = {question_id for submission in batch for question_id in submission.question_ids}
+        questions = Question.objects.in_bulk(ids)
+        for submission in batch:
+            bitmap = bytes(submission.correctness)
+            answers = submission.answers or {}
+            submission.feedback = [
+                {
+                    'question_id': question_id,
+                    'question': getattr(questions.get(question_id), 'text', None),
+                    'your_answer': answers.get(str(question_id)),
+                    'correct_answer': getattr(questions.get(question_id), 'correct_answer', None),
+                    'is_correct': bool(bitmap[i // 8] >> (7 - i % 8) & 1),
+                }
+                for i, question_id in enumerate(submission.question_ids)
+            ]
+        Submission.objects.bulk_update(batch, ['feedback'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_quiz_stats_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='correctness',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='question_ids',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(compact_feedback, expand_feedback),
+        migrations.RemoveField(
+            model_name='submission',
+            name='feedback',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 10:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_compact_submission_feedback'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='accepted_answers',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='match_type',
+            field=models.CharField(choices=[('exact', 'Exact'), ('text', 'Ignore case and spacing'), ('numeric', 'Number within tolerance'), ('regex', 'Regular expression')], default='exact', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='tolerance',
+            field=models.FloatField(blank=True, help_text='Allowed absolute difference for numeric answers', null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 10:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_regraderun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='sample_size',
+            field=models.PositiveIntegerField(blank=True, help_text='Questions drawn per student; empty means every question', null=True),
+        ),
+        migrations.CreateModel(
+            name='QuizAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('seed', models.BigIntegerField()),
+                ('question_ids', models.JSONField(default=list)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='core.quiz')),
+                ('submission', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attempt', to='core.submission')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'user', 'number'), name='unique_quiz_attempt')],
+            },
+        ),
+    ]
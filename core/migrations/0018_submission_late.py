@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_question_bank_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='late',
+            field=models.BooleanField(default=False),
+        ),
+    ]
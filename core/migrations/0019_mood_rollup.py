@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 10:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+
+def fill_rollups(apps, schema_editor):
+    '''Roll up the moods logged so far; later ones are counted as they are saved.'''
+    Mood = apps.get_model('core', 'Mood')
+    MoodRollup = apps.get_model('core', 'MoodRollup')
+    for bucket, truncate in [('day', TruncDay), ('week', TruncWeek), ('month', TruncMonth)]:
+        counts = (
+            Mood.objects.order_by()
+            .annotate(period=truncate('logged_at', output_field=models.DateField()))
+            .values_list('user_id', 'period', 'mood')
+            .annotate(n=Count('pk'))
+        )
+        MoodRollup.objects.bulk_create(
+            (MoodRollup(user_id=user_id, bucket=bucket, period=period, mood=mood, count=n)
+             for user_id, period, mood, n in counts.iterator(chunk_size=2000)),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_submission_late'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoodRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('period', models.DateField()),
+                ('mood', models.CharField(max_length=50)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mood_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'bucket', 'period', 'mood'), name='unique_mood_rollup')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
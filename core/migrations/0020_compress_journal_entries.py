@@ -0,0 +1,67 @@
+# Generated by Django 6.0 on 2026-10-18 11:40
+
+from django.db import migrations, models
+import core.fields
+
+
+BATCH_SIZE = 500
+
+
+def _copy(Journal, source, target):
+    last = 0
+    while True:
+        batch = list(Journal.objects.filter(pk__gt=last).order_by('pk').only('pk', source)[:BATCH_SIZE])
+        if not batch:
+            return
+        for journal in batch:
+            setattr(journal, target, getattr(journal, source))
+        Journal.objects.bulk_update(batch, [target])
+        last = batch[-1].pk
+
+
+def compress_entries(apps, schema_editor):
+    _copy(apps.get_model('core', 'Journal'), 'entry', 'compressed_entry')
+
+
+def expand_entries(apps, schema_editor):
+    _copy(apps.get_model('core', 'Journal'), 'compressed_entry', 'entry')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_mood_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journal',
+            name='compressed_entry',
+            field=core.fields.CompressedTextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(compress_entries, expand_entries),
+        # Only so that unapplying can re-add the column to existing rows
+        migrations.AlterField(
+            model_name='journal',
+            name='entry',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='journal',
+            name='entry',
+        ),
+        migrations.RenameField(
+            model_name='journal',
+            old_name='compressed_entry',
+            new_name='entry',
+        ),
+        migrations.AlterModelOptions(
+            name='journal',
+            options={'ordering': ['-created_at']},
+        ),
+        migrations.AddIndex(
+            model_name='journal',
+            index=models.Index(fields=['user', '-created_at'], name='journal_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 6.0 on 2026-10-18 11:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_journaltext_fts USING fts5(
+        user_id, body,
+        content='core_journaltext', content_rowid='journal_id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER core_journaltext_fts_ai AFTER INSERT ON core_journaltext BEGIN
+        INSERT INTO core_journaltext_fts(rowid, user_id, body)
+        VALUES (new.journal_id, new.user_id, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER core_journaltext_fts_ad AFTER DELETE ON core_journaltext BEGIN
+        INSERT INTO core_journaltext_fts(core_journaltext_fts, rowid, user_id, body)
+        VALUES ('delete', old.journal_id, old.user_id, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER core_journaltext_fts_au AFTER UPDATE OF user_id, body ON core_journaltext BEGIN
+        INSERT INTO core_journaltext_fts(core_journaltext_fts, rowid, user_id, body)
+        VALUES ('delete', old.journal_id, old.user_id, old.body);
+        INSERT INTO core_journaltext_fts(rowid, user_id, body)
+        VALUES (new.journal_id, new.user_id, new.body);
+    END
+    """,
+    "INSERT INTO core_journaltext_fts(core_journaltext_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS core_journaltext_fts_au',
+    'DROP TRIGGER IF EXISTS core_journaltext_fts_ad',
+    'DROP TRIGGER IF EXISTS core_journaltext_fts_ai',
+    'DROP TABLE IF EXISTS core_journaltext_fts',
+]
+
+# Must stay identical to core.search.PG_JOURNAL_VECTOR for the planner to use it
+POSTGRES_FORWARD = [
+    "CREATE INDEX core_journaltext_search_idx ON core_journaltext USING gin ((to_tsvector('english', core_journaltext.body)))",
+]
+
+POSTGRES_REVERSE = ['DROP INDEX IF EXISTS core_journaltext_search_idx']
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+def fill_search_text(apps, schema_editor):
+    Journal = apps.get_model('core', 'Journal')
+    JournalText = apps.get_model('core', 'JournalText')
+    last = 0
+    while True:
+        batch = list(Journal.objects.filter(pk__gt=last).order_by('pk').values_list('pk', 'user_id', 'entry')[:BATCH_SIZE])
+        if not batch:
+            return
+        JournalText.objects.bulk_create(
+            [JournalText(journal_id=pk, user_id=user_id, body=entry) for pk, user_id, entry in batch]
+        )
+        last = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_compress_journal_entries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalText',
+            fields=[
+                ('journal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_text', serialize=False, to='core.journal')),
+                ('body', models.TextField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
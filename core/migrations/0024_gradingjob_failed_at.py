@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_book_title_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gradingjob',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
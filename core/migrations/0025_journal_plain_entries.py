@@ -0,0 +1,184 @@
+# Generated by Django 6.0 on 2026-10-18 16:20
+
+from django.db import migrations, models
+import core.fields
+
+
+BATCH_SIZE = 500
+
+# The search index over the old plain-text copy (see 0021_journal_search_index)
+SQLITE_COPY_FORWARD = [
+    'DROP TRIGGER IF EXISTS core_journaltext_fts_au',
+    'DROP TRIGGER IF EXISTS core_journaltext_fts_ad',
+    'DROP TRIGGER IF EXISTS core_journaltext_fts_ai',
+    'DROP TABLE IF EXISTS core_journaltext_fts',
+]
+
+SQLITE_COPY_REVERSE = [
+    """
+    CREATE VIRTUAL TABLE core_journaltext_fts USING fts5(
+        user_id, body,
+        content='core_journaltext', content_rowid='journal_id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER core_journaltext_fts_ai AFTER INSERT ON core_journaltext BEGIN
+        INSERT INTO core_journaltext_fts(rowid, user_id, body)
+        VALUES (new.journal_id, new.user_id, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER core_journaltext_fts_ad AFTER DELETE ON core_journaltext BEGIN
+        INSERT INTO core_journaltext_fts(core_journaltext_fts, rowid, user_id, body)
+        VALUES ('delete', old.journal_id, old.user_id, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER core_journaltext_fts_au AFTER UPDATE OF user_id, body ON core_journaltext BEGIN
+        INSERT INTO core_journaltext_fts(core_journaltext_fts, rowid, user_id, body)
+        VALUES ('delete', old.journal_id, old.user_id, old.body);
+        INSERT INTO core_journaltext_fts(rowid, user_id, body)
+        VALUES (new.journal_id, new.user_id, new.body);
+    END
+    """,
+    "INSERT INTO core_journaltext_fts(core_journaltext_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_COPY_FORWARD = ['DROP INDEX IF EXISTS core_journaltext_search_idx']
+
+POSTGRES_COPY_REVERSE = [
+    "CREATE INDEX core_journaltext_search_idx ON core_journaltext USING gin ((to_tsvector('english', core_journaltext.body)))",
+]
+
+# The search index over core_journal itself, as for books in 0008_book_search_index
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_journal_fts USING fts5(
+        user_id, entry,
+        content='core_journal', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER core_journal_fts_ai AFTER INSERT ON core_journal BEGIN
+        INSERT INTO core_journal_fts(rowid, user_id, entry)
+        VALUES (new.id, new.user_id, new.entry);
+    END
+    """,
+    """
+    CREATE TRIGGER core_journal_fts_ad AFTER DELETE ON core_journal BEGIN
+        INSERT INTO core_journal_fts(core_journal_fts, rowid, user_id, entry)
+        VALUES ('delete', old.id, old.user_id, old.entry);
+    END
+    """,
+    """
+    CREATE TRIGGER core_journal_fts_au AFTER UPDATE OF user_id, entry ON core_journal BEGIN
+        INSERT INTO core_journal_fts(core_journal_fts, rowid, user_id, entry)
+        VALUES ('delete', old.id, old.user_id, old.entry);
+        INSERT INTO core_journal_fts(rowid, user_id, entry)
+        VALUES (new.id, new.user_id, new.entry);
+    END
+    """,
+    "INSERT INTO core_journal_fts(core_journal_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS core_journal_fts_au',
+    'DROP TRIGGER IF EXISTS core_journal_fts_ad',
+    'DROP TRIGGER IF EXISTS core_journal_fts_ai',
+    'DROP TABLE IF EXISTS core_journal_fts',
+]
+
+# Must stay identical to core.search.PG_JOURNAL_VECTOR for the planner to use it
+POSTGRES_FORWARD = [
+    "CREATE INDEX core_journal_search_idx ON core_journal USING gin ((to_tsvector('english', core_journal.entry)))",
+]
+
+POSTGRES_REVERSE = ['DROP INDEX IF EXISTS core_journal_search_idx']
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+def _copy(Journal, source, target):
+    last = 0
+    while True:
+        batch = list(Journal.objects.filter(pk__gt=last).order_by('pk').only('pk', source)[:BATCH_SIZE])
+        if not batch:
+            return
+        for journal in batch:
+            setattr(journal, target, getattr(journal, source))
+        Journal.objects.bulk_update(batch, [target])
+        last = batch[-1].pk
+
+
+def expand_entries(apps, schema_editor):
+    _copy(apps.get_model('core', 'Journal'), 'entry', 'plain_entry')
+
+
+def compress_entries(apps, schema_editor):
+    _copy(apps.get_model('core', 'Journal'), 'plain_entry', 'entry')
+
+
+def fill_search_text(apps, schema_editor):
+    Journal = apps.get_model('core', 'Journal')
+    JournalText = apps.get_model('core', 'JournalText')
+    last = 0
+    while True:
+        batch = list(Journal.objects.filter(pk__gt=last).order_by('pk').values_list('pk', 'user_id', 'entry')[:BATCH_SIZE])
+        if not batch:
+            return
+        JournalText.objects.bulk_create(
+            [JournalText(journal_id=pk, user_id=user_id, body=entry) for pk, user_id, entry in batch]
+        )
+        last = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_gradingjob_failed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_COPY_FORWARD, 'postgresql': POSTGRES_COPY_FORWARD}),
+            _run({'sqlite': SQLITE_COPY_REVERSE, 'postgresql': POSTGRES_COPY_REVERSE}),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, fill_search_text),
+        migrations.DeleteModel(
+            name='JournalText',
+        ),
+        migrations.AddField(
+            model_name='journal',
+            name='plain_entry',
+            field=models.TextField(default=''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(expand_entries, compress_entries),
+        # Only so that unapplying can re-add the column to existing rows
+        migrations.AlterField(
+            model_name='journal',
+            name='entry',
+            field=core.fields.CompressedTextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='journal',
+            name='entry',
+        ),
+        migrations.RenameField(
+            model_name='journal',
+            old_name='plain_entry',
+            new_name='entry',
+        ),
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
@@ -1,5 +1,5 @@
-from django.db import models
-import random
+from django.db import models, transaction
+from django.db.models.functions import Now
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 import datetime
@@ -41,9 +41,49 @@ class User(AbstractUser):
 # Library Models
 # -------------------------
 
+class Sequence(models.Model):
+    '''Named counter used to hand out identifiers that can never collide.'''
+    name = models.CharField(max_length=50, primary_key=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}={self.last_value}'
+
+
+# EAN-13 prefixes 200-299 are reserved for in-house numbering and are never
+# issued as published ISBNs (978/979), so generated numbers cannot clash with
+# imported ones.
+ISBN_PREFIX = '20'
+
+
+def _isbn_check_digit(digits):
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return str((10 - total % 10) % 10)
+
+
+def generate_isbns(count):
+    """Reserve `count` unused 13‑digit ISBNs from the 'isbn' sequence."""
+    isbns = []
+    while len(isbns) < count:
+        needed = count - len(isbns)
+        with transaction.atomic():
+            Sequence.objects.get_or_create(name='isbn')
+            Sequence.objects.filter(name='isbn').update(last_value=models.F('last_value') + needed)
+            last = Sequence.objects.get(name='isbn').last_value
+        batch = []
+        for n in range(last - needed + 1, last + 1):
+            digits = f'{ISBN_PREFIX}{n:010d}'
+            batch.append(digits + _isbn_check_digit(digits))
+        # Skip numbers someone typed in by hand before the sequence reached them
+        taken = set(Book.objects.filter(isbn__in=batch).values_list('isbn', flat=True))
+        isbns += [isbn for isbn in batch if isbn not in taken]
+    return isbns
+
+
 def generate_isbn():
     """Generate a 13‑digit numeric ISBN."""
-    return ''.join([str(random.randint(0, 9)) for _ in range(13)])
+    return generate_isbns(1)[0]
+
 
 class Book(models.Model):
     title = models.CharField(max_length=200, db_index=True)
@@ -51,15 +91,45 @@ class Book(models.Model):
     isbn = models.CharField(max_length=13, unique=True)
     published_date = models.DateField()
     copies_available = models.PositiveIntegerField(default=1)
+    # Copies owned, on the shelf or not; lets copies_available be recomputed
+    total_copies = models.PositiveIntegerField(null=True, blank=True)
     genre = models.CharField(max_length=100, blank=True, null=True)
     summary = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        if not self.isbn:
+            self.isbn = generate_isbn()
+        if self.total_copies is None and self._state.adding:
+            self.total_copies = self.copies_available
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f'{self.title} by {self.author}'
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            # Keyset pagination in title order
+            models.Index(fields=['title'], name='book_title_idx'),
+        ]
+
+
+class TransactionQuerySet(models.QuerySet):
+    def open(self):
+        return self.filter(return_date__isnull=True)
+
+    def past_due(self, now=None):
+        return self.open().filter(due_date__lt=now or timezone.now())
+
+    def with_overdue(self):
+        '''Annotate `overdue`, the SQL equivalent of Transaction.is_overdue().'''
+        return self.annotate(
+            overdue=models.ExpressionWrapper(
+                models.Q(return_date__isnull=True, due_date__lt=Now()),
+                output_field=models.BooleanField(),
+            )
+        )
 
 
 class Transaction(models.Model):
@@ -76,6 +146,8 @@ class Transaction(models.Model):
     return_date = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='borrowed', db_index=True)
 
+    objects = TransactionQuerySet.as_manager()
+
     def is_overdue(self):
         return self.return_date is None and timezone.now() > self.due_date
 
@@ -84,6 +156,20 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-checkout_date']
+        indexes = [
+            models.Index(fields=['return_date', 'due_date'], name='transaction_open_due_idx'),
+            # Keyset pagination: admin-wide and per-user listings
+            models.Index(fields=['-checkout_date'], name='transaction_checkout_idx'),
+            models.Index(fields=['user', '-checkout_date'], name='transaction_user_checkout_idx'),
+        ]
+        constraints = [
+            # A student can hold at most one open borrow per book
+            models.UniqueConstraint(
+                fields=['user', 'book'],
+                condition=models.Q(return_date__isnull=True),
+                name='unique_open_borrow',
+            ),
+        ]
 
 
 # -------------------------
@@ -117,6 +203,10 @@ class Quiz(models.Model):
     description = models.TextField(blank=True)
     subject = models.CharField(max_length=50, choices=SUBJECT_CHOICES, default='general')
     duration = models.IntegerField(default=10, help_text='Duration in minutes')
+    # Question-bank mode: each student answers this many questions drawn from the quiz's questions
+    sample_size = models.PositiveIntegerField(
+        blank=True, null=True, help_text='Questions drawn per student; empty means every question'
+    )
 
     created_by = models.ForeignKey(
         User,
@@ -130,9 +220,34 @@ class Quiz(models.Model):
 
 
 class Question(models.Model):
+    MATCH_CHOICES = [
+        ('exact', 'Exact'),
+        ('text', 'Ignore case and spacing'),
+        ('numeric', 'Number within tolerance'),
+        ('regex', 'Regular expression'),
+    ]
+
     quiz = models.ForeignKey(Quiz, related_name='questions', on_delete=models.CASCADE)
     text = models.TextField()
     correct_answer = models.CharField(max_length=200)
+    # How answers are compared with correct_answer and accepted_answers
+    match_type = models.CharField(max_length=10, choices=MATCH_CHOICES, default='exact')
+    accepted_answers = models.JSONField(default=list, blank=True)
+    tolerance = models.FloatField(blank=True, null=True, help_text='Allowed absolute difference for numeric answers')
+
+    # Fields that decide whether an answer is correct; see core.regrade
+    RULE_FIELDS = ('correct_answer', 'match_type', 'accepted_answers', 'tolerance')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the rule as loaded, so saving can tell whether grading changed
+        if all(field in field_names for field in cls.RULE_FIELDS):
+            instance._loaded_rule = instance.grading_rule()
+        return instance
+
+    def grading_rule(self):
+        return tuple(getattr(self, field) for field in self.RULE_FIELDS)
 
     def __str__(self):
         return f'Q: {self.text[:50]}...'
@@ -146,11 +261,127 @@ class Submission(models.Model):
     score = models.IntegerField(default=0)
     percentage = models.IntegerField(default=0)
     status = models.CharField(max_length=10, choices=[("pass", "Pass"), ("fail", "Fail"), ("pending", "Pending")], default="pending")  # pass/fail
-    feedback = models.JSONField(default=list)  # per-question feedback
+    # Questions graded, in answer-key order, and a bitmap of the correct ones;
+    # full feedback is rebuilt from these by grading.feedback()
+    question_ids = models.JSONField(default=list)
+    correctness = models.BinaryField(default=bytes)
+    # Arrived after the quiz's time ran out but within the grace period
+    late = models.BooleanField(default=False)
 
     def __str__(self):
         return f'{self.user.username} - {self.quiz.title} ({self.score})'
 
+    class Meta:
+        ordering = ['-submitted_at']
+        indexes = [
+            models.Index(fields=['-submitted_at'], name='submission_submitted_idx'),
+            models.Index(fields=['user', '-submitted_at'], name='submission_user_submitted_idx'),
+        ]
+
+
+class QuizAttempt(models.Model):
+    '''A student's start of a quiz, recording which questions they were given.'''
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
+    number = models.PositiveIntegerField()
+    seed = models.BigIntegerField()
+    question_ids = models.JSONField(default=list)
+    started_at = models.DateTimeField(auto_now_add=True)
+    submission = models.OneToOneField(
+        Submission, on_delete=models.SET_NULL, blank=True, null=True, related_name='attempt'
+    )
+
+    def __str__(self):
+        return f'{self.user.username} - {self.quiz.title} attempt {self.number}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'user', 'number'], name='unique_quiz_attempt'),
+        ]
+
+
+class GradingJob(models.Model):
+    '''Queue entry for a submission waiting to be graded by a worker.'''
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, related_name='grading_job')
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+    claim_token = models.CharField(max_length=32, blank=True, null=True, db_index=True)
+    claimed_at = models.DateTimeField(blank=True, null=True, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    # Set once the job has been claimed MAX_ATTEMPTS times without being graded (see core.grading)
+    failed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'Grading job for submission {self.submission_id}'
+
+
+class RegradeRun(models.Model):
+    '''
+    A pass that regrades a quiz's past submissions after its answer key changed.
+
+    Progress is saved per chunk: `cursor` is the last submission handled, so
+    an interrupted run carries on from there.
+    '''
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='regrade_runs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    cursor = models.BigIntegerField(default=0)
+    upper_bound = models.BigIntegerField(blank=True, null=True)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    changed = models.PositiveIntegerField(default=0)
+    claim_token = models.CharField(max_length=32, blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'Regrade of quiz {self.quiz_id} ({self.status}, {self.processed}/{self.total})'
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class QuizStats(models.Model):
+    '''Running totals over a quiz's graded submissions, kept up to date by core.quizstats.'''
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0)
+    passes = models.PositiveIntegerField(default=0)
+    total_score = models.BigIntegerField(default=0)
+    total_percentage = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Stats for quiz {self.quiz_id} ({self.attempts} attempts)'
+
+
+class LeaderboardEntry(models.Model):
+    '''A student's best graded attempt at a quiz; only the top entries per quiz are kept.'''
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='leaderboard')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    percentage = models.IntegerField()
+    score = models.IntegerField()
+    achieved_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.user.username} - {self.quiz.title} ({self.percentage}%)'
+
+    class Meta:
+        ordering = ['quiz', '-percentage', 'achieved_at']
+        indexes = [
+            models.Index(fields=['quiz', '-percentage', 'achieved_at'], name='leaderboard_rank_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'user'], name='unique_leaderboard_entry'),
+        ]
+
 
 class MentorshipRequest(models.Model):
     student = models.ForeignKey(User, related_name='requests', on_delete=models.CASCADE)
@@ -175,20 +406,78 @@ class MentorshipRequest(models.Model):
 class Mood(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='moods')
     mood = models.CharField(max_length=50, db_index=True)
-    logged_at = models.DateTimeField(auto_now_add=True)
+    # Set by the server, or taken from the client for moods logged offline (see core.sync)
+    logged_at = models.DateTimeField(default=timezone.now)
+    # Idempotency key of an offline-logged mood, unique per user
+    client_key = models.CharField(max_length=64, blank=True, null=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the mood as loaded, so saving can move it between rollups
+        if 'mood' in field_names:
+            instance._loaded_mood = instance.mood
+        return instance
 
     def __str__(self):
         return f'{self.user.username} - {self.mood}'
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'client_key'], condition=models.Q(client_key__isnull=False), name='unique_mood_client_key',
+            ),
+        ]
+
+
+class MoodRollup(models.Model):
+    '''Count of a user's moods per day, week or month, kept in step with Mood by core.moodstats.'''
+    BUCKET_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mood_rollups')
+    bucket = models.CharField(max_length=5, choices=BUCKET_CHOICES)
+    # First day of the bucket (weeks start on Monday)
+    period = models.DateField()
+    mood = models.CharField(max_length=50)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user.username} - {self.mood} ({self.bucket} of {self.period})'
+
+    class Meta:
+        constraints = [
+            # Also the index a chart reads: (user, bucket) over a range of periods
+            models.UniqueConstraint(fields=['user', 'bucket', 'period', 'mood'], name='unique_mood_rollup'),
+        ]
+
 
 class Journal(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='journals')
+    # List views defer this column; it is full-text indexed for the owner's search (see core.search)
     entry = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by the server, or taken from the client for entries written offline (see core.sync)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Idempotency key of an offline-written entry, unique per user
+    client_key = models.CharField(max_length=64, blank=True, null=True)
 
     def __str__(self):
         return f'Journal by {self.user.username} on {self.created_at.date()}'
 
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='journal_user_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'client_key'], condition=models.Q(client_key__isnull=False), name='unique_journal_client_key',
+            ),
+        ]
+
 
 class ForumPost(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
@@ -204,3 +493,6 @@ class ForumPost(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='forumpost_created_idx'),
+        ]
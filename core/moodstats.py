@@ -0,0 +1,127 @@
+import datetime
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import Count, DateField, F, Q
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from .models import Mood, MoodRollup
+
+
+# -------------------------
+# Mood Rollups
+# -------------------------
+
+BUCKETS = [bucket for bucket, _ in MoodRollup.BUCKET_CHOICES]
+
+_TRUNCATE = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+
+def _first_day(day, bucket):
+    if bucket == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def period_start(moment, bucket):
+    '''First day of the day/week/month containing `moment`, in the site's time zone.'''
+    return _first_day(timezone.localtime(moment).date(), bucket)
+
+
+def _periods(moment):
+    return Q(*[Q(bucket=bucket, period=period_start(moment, bucket)) for bucket in BUCKETS], _connector=Q.OR)
+
+
+def _add(user_id, mood, moment, delta):
+    rollups = MoodRollup.objects.filter(_periods(moment), user_id=user_id, mood=mood)
+    with transaction.atomic():
+        if delta > 0:
+            MoodRollup.objects.bulk_create(
+                [MoodRollup(user_id=user_id, bucket=bucket, period=period_start(moment, bucket), mood=mood) for bucket in BUCKETS],
+                ignore_conflicts=True,
+            )
+        rollups.update(count=F('count') + delta)
+        if delta < 0:
+            rollups.filter(count=0).delete()
+
+
+def record(mood):
+    '''Count a newly logged mood in each of its buckets.'''
+    _add(mood.user_id, mood.mood, mood.logged_at, 1)
+
+
+def record_many(moods):
+    '''Count a batch of new moods (e.g. from bulk_create, which sends no signals), one UPDATE per distinct increment.'''
+    counts = Counter(
+        (mood.user_id, bucket, period_start(mood.logged_at, bucket), mood.mood) for mood in moods for bucket in BUCKETS
+    )
+    by_increment = defaultdict(list)
+    for key, n in counts.items():
+        by_increment[n].append(key)
+    with transaction.atomic():
+        MoodRollup.objects.bulk_create(
+            [MoodRollup(user_id=user_id, bucket=bucket, period=period, mood=mood) for user_id, bucket, period, mood in counts],
+            ignore_conflicts=True,
+        )
+        for n, keys in by_increment.items():
+            rows = Q(*[Q(user_id=u, bucket=b, period=p, mood=m) for u, b, p, m in keys], _connector=Q.OR)
+            MoodRollup.objects.filter(rows).update(count=F('count') + n)
+
+
+def forget(mood, previous=None):
+    '''Remove a deleted (or, with `previous`, relabelled) mood from its buckets, dropping rows that reach zero.'''
+    _add(mood.user_id, previous or mood.mood, mood.logged_at, -1)
+
+
+def summary(user_id, bucket, since=None, until=None):
+    '''
+    A user's mood counts per bucket, oldest first, read from the rollup index.
+
+    `since` and `until` are dates; periods overlapping them are included.
+    '''
+    rollups = MoodRollup.objects.filter(user_id=user_id, bucket=bucket)
+    if since is not None:
+        rollups = rollups.filter(period__gte=_first_day(since, bucket))
+    if until is not None:
+        rollups = rollups.filter(period__lte=until)
+    series = {}
+    for period, mood, count in rollups.order_by('period', 'mood').values_list('period', 'mood', 'count'):
+        point = series.setdefault(period, {'period': period, 'total': 0, 'moods': {}})
+        point['moods'][mood] = count
+        point['total'] += count
+    return list(series.values())
+
+
+# -------------------------
+# Full Rebuild
+# -------------------------
+
+def rebuild(user_ids=None):
+    '''
+    Recompute rollups from Mood with one grouped query per bucket, for repairs.
+
+    Returns the number of rollup rows written.
+    '''
+    moods = Mood.objects.order_by()
+    if user_ids is not None:
+        moods = moods.filter(user_id__in=user_ids)
+    rollups = []
+    for bucket, truncate in _TRUNCATE.items():
+        counts = (
+            moods.annotate(period=truncate('logged_at', output_field=DateField()))
+            .values_list('user_id', 'period', 'mood')
+            .annotate(n=Count('pk'))
+        )
+        rollups += [
+            MoodRollup(user_id=user_id, bucket=bucket, period=period, mood=mood, count=n)
+            for user_id, period, mood, n in counts.iterator(chunk_size=2000)
+        ]
+
+    with transaction.atomic():
+        old = MoodRollup.objects.all()
+        if user_ids is not None:
+            old = old.filter(user_id__in=user_ids)
+        old.delete()
+        MoodRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
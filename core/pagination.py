@@ -0,0 +1,64 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class HubPagination(PageNumberPagination):
+    '''Default pagination: clients may ask for bigger pages, up to a cap.'''
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class HubCursorPagination(CursorPagination):
+    '''Keyset pagination on the view's `cursor_ordering`; no COUNT(*) and no OFFSET scan.'''
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        return (view.cursor_ordering,)
+
+
+class OptInCursorPagination(HubPagination):
+    '''
+    Page numbers by default; keyset pagination when the client sends
+    ?pagination=cursor (the next/previous links keep the parameter).
+
+    Search results (?q=) are ordered by rank, which a keyset on the view's
+    cursor_ordering would throw away, so they only come in numbered pages.
+    '''
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    search_query_param = 'q'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if request.query_params.get(self.mode_query_param) == 'cursor' or self.cursor_query_param in request.query_params:
+            if request.query_params.get(self.search_query_param, '').strip():
+                raise ValidationError({'error': 'Search results are ranked and cannot be paginated by cursor'})
+            self.cursor_paginator = HubCursorPagination()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "cursor" for keyset pagination.',
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+        ]
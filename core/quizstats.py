@@ -0,0 +1,165 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from .models import LeaderboardEntry, QuizStats, Submission
+
+
+# -------------------------
+# Incremental Quiz Statistics
+# -------------------------
+
+# Entries kept per quiz leaderboard
+LEADERBOARD_SIZE = 10
+
+LEADERBOARD_ORDER = ['-percentage', 'achieved_at']
+
+
+def _add_to_stats(quiz_id, submissions):
+    QuizStats.objects.bulk_create([QuizStats(quiz_id=quiz_id)], ignore_conflicts=True)
+    QuizStats.objects.filter(quiz_id=quiz_id).update(
+        attempts=F('attempts') + len(submissions),
+        passes=F('passes') + sum(s.status == 'pass' for s in submissions),
+        total_score=F('total_score') + sum(s.score for s in submissions),
+        total_percentage=F('total_percentage') + sum(s.percentage for s in submissions),
+    )
+
+
+def _add_to_leaderboard(quiz_id, submissions):
+    best = {}
+    for submission in submissions:
+        current = best.get(submission.user_id)
+        if current is None or submission.percentage > current.percentage:
+            best[submission.user_id] = submission
+
+    board = LeaderboardEntry.objects.filter(quiz_id=quiz_id)
+    cutoff = board.order_by(*LEADERBOARD_ORDER).values_list('percentage', flat=True)[LEADERBOARD_SIZE - 1:LEADERBOARD_SIZE]
+    cutoff = next(iter(cutoff), None)
+
+    held = dict(board.filter(user_id__in=best).order_by().values_list('user_id', 'percentage'))
+    created = []
+    for user_id, submission in best.items():
+        # A full board only admits attempts that beat its last place
+        if cutoff is not None and submission.percentage <= cutoff:
+            continue
+        if user_id in held and submission.percentage <= held[user_id]:
+            continue
+        fields = {'percentage': submission.percentage, 'score': submission.score, 'achieved_at': submission.submitted_at}
+        if user_id in held:
+            board.filter(user_id=user_id, percentage__lt=submission.percentage).update(**fields)
+        else:
+            created.append(LeaderboardEntry(quiz_id=quiz_id, user_id=user_id, **fields))
+    if not created:
+        return
+    LeaderboardEntry.objects.bulk_create(created, ignore_conflicts=True)
+
+    # A student pushed off the board can only return with a better score,
+    # which would clear the (only ever rising) cutoff anyway
+    overflow = list(board.order_by(*LEADERBOARD_ORDER).values_list('pk', flat=True)[LEADERBOARD_SIZE:])
+    if overflow:
+        LeaderboardEntry.objects.filter(pk__in=overflow).delete()
+
+
+def record(submissions):
+    '''Fold newly graded submissions into their quizzes' stats and leaderboards.'''
+    by_quiz = defaultdict(list)
+    for submission in submissions:
+        if submission.status != 'pending':
+            by_quiz[submission.quiz_id].append(submission)
+    with transaction.atomic():
+        for quiz_id in sorted(by_quiz):
+            _add_to_stats(quiz_id, by_quiz[quiz_id])
+            _add_to_leaderboard(quiz_id, by_quiz[quiz_id])
+
+
+def summary(stats):
+    '''API payload for a QuizStats row, or for a quiz nobody has attempted when `stats` is None.'''
+    attempts = stats.attempts if stats else 0
+    return {
+        'attempts': attempts,
+        'passes': stats.passes if stats else 0,
+        'pass_rate': round(stats.passes / attempts, 3) if attempts else None,
+        'average_score': round(stats.total_score / attempts, 2) if attempts else None,
+        'average_percentage': round(stats.total_percentage / attempts, 2) if attempts else None,
+        'updated_at': stats.updated_at if stats else None,
+    }
+
+
+def leaderboard(quiz_id, limit=LEADERBOARD_SIZE):
+    '''The quiz's top entries, best first, read straight off the rank index.'''
+    entries = (
+        LeaderboardEntry.objects.filter(quiz_id=quiz_id)
+        .select_related('user')
+        .order_by(*LEADERBOARD_ORDER)[:limit]
+    )
+    return [
+        {
+            'rank': rank,
+            'user': entry.user.username,
+            'percentage': entry.percentage,
+            'score': entry.score,
+            'achieved_at': entry.achieved_at,
+        }
+        for rank, entry in enumerate(entries, start=1)
+    ]
+
+
+# -------------------------
+# Full Rebuild
+# -------------------------
+
+def rebuild(quiz_ids=None):
+    '''
+    Recompute stats and leaderboards from Submission, for repairs.
+
+    Runs a single pass over graded submissions, so it is far too slow for the
+    request path but fine for a management command. Returns the number of quizzes rebuilt.
+    '''
+    graded = Submission.objects.exclude(status='pending').order_by()
+    if quiz_ids is not None:
+        graded = graded.filter(quiz_id__in=quiz_ids)
+
+    totals = (
+        graded.values('quiz_id')
+        .annotate(
+            n=Count('pk'),
+            passed=Count('pk', filter=Q(status='pass')),
+            score=Sum('score'),
+            percent=Sum('percentage'),
+        )
+    )
+    stats = [
+        QuizStats(
+            quiz_id=row['quiz_id'], attempts=row['n'], passes=row['passed'],
+            total_score=row['score'], total_percentage=row['percent'],
+        )
+        for row in totals
+    ]
+
+    # Best attempt per (quiz, student): the first row of each group in this ordering
+    best = {}
+    rows = graded.order_by('quiz_id', 'user_id', '-percentage', 'submitted_at').values_list(
+        'quiz_id', 'user_id', 'percentage', 'score', 'submitted_at',
+    )
+    for quiz_id, user_id, percentage, score, submitted_at in rows.iterator(chunk_size=2000):
+        best.setdefault((quiz_id, user_id), (percentage, submitted_at, score))
+
+    boards = defaultdict(list)
+    for (quiz_id, user_id), (percentage, submitted_at, score) in best.items():
+        boards[quiz_id].append(LeaderboardEntry(
+            quiz_id=quiz_id, user_id=user_id, percentage=percentage, score=score, achieved_at=submitted_at,
+        ))
+    entries = []
+    for board in boards.values():
+        board.sort(key=lambda e: (-e.percentage, e.achieved_at))
+        entries += board[:LEADERBOARD_SIZE]
+
+    with transaction.atomic():
+        old_stats, old_entries = QuizStats.objects.all(), LeaderboardEntry.objects.all()
+        if quiz_ids is not None:
+            old_stats = old_stats.filter(quiz_id__in=quiz_ids)
+            old_entries = old_entries.filter(quiz_id__in=quiz_ids)
+        old_stats.delete()
+        old_entries.delete()
+        QuizStats.objects.bulk_create(stats, batch_size=1000)
+        LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+    return len(stats)
@@ -0,0 +1,215 @@
+import datetime
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count, F, Max, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Quiz, RegradeRun, Submission
+from . import grading, quizstats
+
+
+# -------------------------
+# Regrading After Answer Key Changes
+# -------------------------
+
+# Submissions read, regraded and written back per transaction
+CHUNK_SIZE = 2000
+
+# A running regrade whose worker has not reported progress for this long is resumed by another
+STALE_AFTER = datetime.timedelta(minutes=5)
+
+RESULT_FIELDS = ['score', 'percentage', 'status', 'question_ids', 'correctness']
+
+logger = logging.getLogger(__name__)
+
+
+class LostClaim(Exception):
+    '''Another worker took over the run (ours was considered stale).'''
+
+
+def enqueue(quiz_id):
+    '''Queue a regrade of the quiz now; returns the pending run, shared with any already queued.'''
+    run = RegradeRun.objects.filter(quiz_id=quiz_id, status='pending').first()
+    # The quiz may be gone if it was deleted along with its questions
+    if run is None and Quiz.objects.filter(pk=quiz_id).exists():
+        run = RegradeRun.objects.create(quiz_id=quiz_id)
+    return run
+
+
+def schedule(quiz_id):
+    '''Queue a regrade of the quiz once the current transaction commits.'''
+    transaction.on_commit(lambda: enqueue(quiz_id))
+
+
+def claim_run(quiz_id=None, include_failed=False):
+    '''Claim the oldest pending (or stalled) run, optionally for one quiz; None if there is none.'''
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    claimable = Q(status='pending') | Q(status='running', heartbeat_at__lt=now - STALE_AFTER)
+    if include_failed:
+        claimable |= Q(status='failed')
+    runs = RegradeRun.objects.filter(claimable)
+    if quiz_id is not None:
+        runs = runs.filter(quiz_id=quiz_id)
+    with transaction.atomic():
+        ids = list(runs.select_for_update(skip_locked=True).order_by('pk').values_list('pk', flat=True)[:1])
+        if not ids or not runs.filter(pk=ids[0]).update(
+            status='running', claim_token=token, heartbeat_at=now, error='',
+            started_at=Coalesce(F('started_at'), Value(now)),
+        ):
+            return None
+    return RegradeRun.objects.get(pk=ids[0])
+
+
+def regrade_rows(raw_key, rows):
+    '''
+    Regrade (pk, answers, question_ids) rows against a compiled answer key.
+
+    Each submission is regraded on the questions it was originally graded on
+    that still exist, so questions added later do not count against it. Pure
+    Python with no database access, so it can run in a worker process.
+    '''
+    key = grading.compile_matchers(raw_key)
+    subsets, results = {}, []
+    for pk, answers, question_ids in rows:
+        ids = tuple(question_ids or ())
+        subset = subsets.get(ids)
+        if subset is None:
+            subset = subsets[ids] = grading.select(key, ids)
+        results.append((pk, grading.grade(answers, subset)))
+    return results
+
+
+def _write_results(results):
+    '''
+    Save (pk, result) pairs with one parameterised UPDATE run through executemany.
+
+    bulk_update's per-field CASE expressions grow with the batch and took ~30x
+    longer for a 2000-row chunk on SQLite.
+    '''
+    if not results:
+        return
+    fields = [Submission._meta.get_field(name) for name in RESULT_FIELDS]
+    qn = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        qn(Submission._meta.db_table),
+        ', '.join(f'{qn(field.column)} = %s' for field in fields),
+        qn(Submission._meta.pk.column),
+    )
+    params = [[field.get_db_prep_save(result[field.name], connection) for field in fields] + [pk] for pk, result in results]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _split(rows, parts):
+    size = -(-len(rows) // parts)
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+def execute(run, chunk_size=CHUNK_SIZE, processes=1, progress=None):
+    '''
+    Carry a claimed run through to the end, starting from its cursor.
+
+    Each chunk is read by keyset, regraded (in `processes` worker processes
+    when more than one), and only the submissions whose result changed are
+    written back, in a short transaction that also advances the cursor.
+    No lock is held between chunks. `progress(run)` is called after each
+    chunk.
+    '''
+    graded = Submission.objects.filter(quiz_id=run.quiz_id).exclude(status='pending').order_by('pk')
+    if run.upper_bound is None:
+        # Fix the set of submissions up front; later ones are graded with the new key anyway
+        bounds = graded.aggregate(n=Count('pk'), last=Max('pk'))
+        run.upper_bound, run.total = bounds['last'] or 0, bounds['n']
+        RegradeRun.objects.filter(pk=run.pk, claim_token=run.claim_token).update(
+            upper_bound=run.upper_bound, total=run.total,
+        )
+
+    pool = None
+    if processes > 1:
+        # Workers are spawned, not forked: run_grading_workers calls this from a
+        # thread, and a fork would copy other threads' held locks and sockets
+        connections.close_all()
+        pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup)
+    try:
+        while True:
+            rows = list(
+                graded.filter(pk__gt=run.cursor, pk__lte=run.upper_bound)
+                .values_list('pk', 'answers', 'question_ids', 'correctness', 'score', 'percentage', 'status')
+                [:chunk_size]
+            )
+            if not rows:
+                break
+            raw_key = grading.compile_answer_key(run.quiz_id)
+            work = [(pk, answers, question_ids) for pk, answers, question_ids, *_ in rows]
+            if pool:
+                slices = _split(work, processes)
+                results = [r for part in pool.map(regrade_rows, [raw_key] * len(slices), slices) for r in part]
+            else:
+                results = regrade_rows(raw_key, work)
+
+            changed = []
+            for (pk, _, question_ids, correctness, score, percentage, status), (_, result) in zip(rows, results):
+                current = {
+                    'score': score, 'percentage': percentage, 'status': status,
+                    'question_ids': question_ids, 'correctness': bytes(correctness),
+                }
+                if current != result:
+                    changed.append((pk, result))
+
+            cursor = rows[-1][0]
+            with transaction.atomic():
+                if not RegradeRun.objects.filter(pk=run.pk, claim_token=run.claim_token).update(
+                    cursor=cursor, processed=F('processed') + len(rows), changed=F('changed') + len(changed),
+                    heartbeat_at=timezone.now(),
+                ):
+                    raise LostClaim(f'Regrade run {run.pk} was taken over by another worker')
+                _write_results(changed)
+            run.cursor = cursor
+            run.processed += len(rows)
+            run.changed += len(changed)
+            if progress:
+                progress(run)
+    except LostClaim:
+        raise
+    except Exception as e:
+        RegradeRun.objects.filter(pk=run.pk, claim_token=run.claim_token).update(status='failed', error=str(e))
+        raise
+    finally:
+        if pool:
+            pool.shutdown()
+
+    with transaction.atomic():
+        if run.changed:
+            quizstats.rebuild([run.quiz_id])
+        RegradeRun.objects.filter(pk=run.pk, claim_token=run.claim_token).update(
+            status='done', finished_at=timezone.now(),
+        )
+    run.status = 'done'
+    return run
+
+
+def default_processes():
+    return settings.REGRADE_PROCESSES or os.cpu_count() or 1
+
+
+def process_next(chunk_size=CHUNK_SIZE, processes=None):
+    '''Claim and finish one queued regrade; returns the number of submissions processed.'''
+    run = claim_run()
+    if run is None:
+        return 0
+    before = run.processed
+    try:
+        run = execute(run, chunk_size, processes or default_processes())
+    except LostClaim:
+        logger.warning('Regrade run %s of quiz %s was taken over by another worker', run.pk, run.quiz_id)
+    except Exception:
+        # Already marked failed on the run; log it and keep the worker alive
+        logger.exception('Regrade run %s of quiz %s failed', run.pk, run.quiz_id)
+    return run.processed - before
@@ -0,0 +1,134 @@
+import re
+from django.db import connection
+from django.db.models import Q
+
+
+# -------------------------
+# Book Catalogue Search
+# -------------------------
+
+# Both indexes are created by migration 0008_book_search_index:
+#   - SQLite: an external-content FTS5 table kept in sync by triggers
+#   - PostgreSQL: a GIN index over this exact tsvector expression
+# SQLite drops triggers when a migration rebuilds core_book, so any such
+# migration has to recreate them.
+SQLITE_BOOK_FTS = 'core_book_fts'
+
+PG_BOOK_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(core_book.title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(core_book.author, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(core_book.genre, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce(core_book.summary, '')), 'D')"
+)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _fts5_query(q):
+    '''Turn free text into a safe FTS5 query: every term must match, the last as a prefix.'''
+    terms = [f'"{term}"' for term in TOKEN_RE.findall(q)]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_books(queryset, q):
+    '''Filter a Book queryset by free text over title, author, genre and summary, best match first.'''
+    vendor = connection.vendor
+
+    if vendor == 'sqlite':
+        match = _fts5_query(q)
+        if not match:
+            return queryset.none()
+        # bm25() ranks lower-is-better; columns weighted title > author > genre > summary
+        return queryset.extra(
+            tables=[SQLITE_BOOK_FTS],
+            where=[f'{SQLITE_BOOK_FTS}.rowid = core_book.id', f'{SQLITE_BOOK_FTS} MATCH %s'],
+            params=[match],
+            select={'rank': f'bm25({SQLITE_BOOK_FTS}, 10.0, 5.0, 2.0, 1.0)'},
+            order_by=['rank', 'title'],
+        )
+
+    if vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery('english', %s)"
+        return queryset.extra(
+            where=[f'({PG_BOOK_VECTOR}) @@ {tsquery}'],
+            params=[q],
+            select={'rank': f'ts_rank({PG_BOOK_VECTOR}, {tsquery})'},
+            select_params=[q],
+            order_by=['-rank', 'title'],
+        )
+
+    # No full-text index on other backends: fall back to a substring scan
+    return queryset.filter(
+        Q(title__icontains=q) | Q(author__icontains=q) | Q(genre__icontains=q) | Q(summary__icontains=q)
+    )
+
+
+# -------------------------
+# Journal Search
+# -------------------------
+
+# Both indexes are created by migration 0025_journal_plain_entries:
+#   - SQLite: an external-content FTS5 table kept in sync by triggers, with
+#     the owner's id indexed as its own column so a match is scoped to one
+#     user's documents inside the index
+#   - PostgreSQL: a GIN index over this exact tsvector expression, combined
+#     with the user_id index
+# As with books, a migration that rebuilds core_journal on SQLite has to
+# recreate the triggers.
+SQLITE_JOURNAL_FTS = 'core_journal_fts'
+
+PG_JOURNAL_VECTOR = "to_tsvector('english', core_journal.entry)"
+
+SNIPPET_START, SNIPPET_END = '<mark>', '</mark>'
+
+# Approximate number of words around the matches in a snippet
+SNIPPET_WORDS = 16
+
+
+def search_journals(queryset, user, q):
+    '''
+    Filter a Journal queryset to `user`'s entries matching free text, best match first.
+
+    Each result gets a `snippet` with the matches wrapped in <mark> tags,
+    built by the database, so entry bodies are never loaded.
+    '''
+    vendor = connection.vendor
+    queryset = queryset.filter(user=user)
+
+    if vendor == 'sqlite':
+        terms = _fts5_query(q)
+        if not terms:
+            return queryset.none()
+        # The owner is matched inside the index too. The unary + keeps SQLite
+        # from probing the index once per row of the user's journals (via the
+        # user_id filter), which is ~200x slower than running the match once
+        return queryset.extra(
+            tables=[SQLITE_JOURNAL_FTS],
+            where=[f'+{SQLITE_JOURNAL_FTS}.rowid = core_journal.id', f'{SQLITE_JOURNAL_FTS} MATCH %s'],
+            params=[f'user_id : "{int(user.pk)}" AND entry : ({terms})'],
+            select={
+                'snippet': f"snippet({SQLITE_JOURNAL_FTS}, 1, %s, %s, '…', %s)",
+                'rank': f'bm25({SQLITE_JOURNAL_FTS}, 0.0, 1.0)',
+            },
+            select_params=[SNIPPET_START, SNIPPET_END, SNIPPET_WORDS],
+            order_by=['rank', '-created_at'],
+        )
+
+    if vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery('english', %s)"
+        options = f'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}'
+        return queryset.extra(
+            where=[f'{PG_JOURNAL_VECTOR} @@ {tsquery}'],
+            params=[q],
+            select={
+                'snippet': f"ts_headline('english', core_journal.entry, {tsquery}, %s)",
+                'rank': f'ts_rank({PG_JOURNAL_VECTOR}, {tsquery})',
+            },
+            select_params=[q, options, q],
+            order_by=['-rank', '-created_at'],
+        )
+
+    # No full-text index on other backends: a substring scan, without snippets
+    return queryset.filter(entry__icontains=q).extra(select={'snippet': 'NULL'})
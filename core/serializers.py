@@ -1,7 +1,10 @@
+import datetime
 from rest_framework import serializers
 from django.core import exceptions
+from django.db import transaction
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.utils import timezone
 from .models import (
     Book,
     Transaction,
@@ -9,12 +12,15 @@ from .models import (
     Quiz,
     Question,
     Submission,
+    QuizAttempt,
+    RegradeRun,
     MentorshipRequest,
     Mood,
     Journal,
     ForumPost,
     User,
 )
+from . import attempts, caching, grading, regrade, sync
 
 User = get_user_model()
 
@@ -55,12 +61,20 @@ class BookSerializer(serializers.ModelSerializer):
             'isbn',
             'published_date',
             'copies_available',
+            'total_copies',
             'genre',
             'summary',
             'created_at',
         ]
         read_only_fields = ['created_at','isbn']
 
+    def update(self, instance, validated_data):
+        # Editing stock by hand adds or removes owned copies too
+        if 'copies_available' in validated_data and 'total_copies' not in validated_data and instance.total_copies is not None:
+            delta = validated_data['copies_available'] - instance.copies_available
+            validated_data['total_copies'] = max(instance.total_copies + delta, 0)
+        return super().update(instance, validated_data)
+
 
 class TransactionSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
@@ -82,7 +96,22 @@ class TransactionSerializer(serializers.ModelSerializer):
         read_only_fields = ['checkout_date', 'due_date', 'return_date', 'is_overdue']
 
     def get_is_overdue(self, obj):
-        return obj.is_overdue()
+        # Prefer the SQL annotation from TransactionQuerySet.with_overdue()
+        overdue = getattr(obj, 'overdue', None)
+        return obj.is_overdue() if overdue is None else overdue
+
+
+class BulkLoanItemSerializer(serializers.Serializer):
+    user = serializers.IntegerField()
+    book = serializers.IntegerField()
+
+
+class BulkLoanSerializer(serializers.Serializer):
+    items = serializers.ListField(
+        child=BulkLoanItemSerializer(),
+        allow_empty=False,
+        max_length=500,
+    )
 
 
 # -------------------------
@@ -147,15 +176,40 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
+# Fields that decide how a question is graded
+QUESTION_RULE_FIELDS = ['correct_answer', 'match_type', 'accepted_answers', 'tolerance']
+QUESTION_FIELDS = ['text', *QUESTION_RULE_FIELDS]
+
+
 class QuestionSerializer(serializers.ModelSerializer):
+    accepted_answers = serializers.ListField(
+        child=serializers.CharField(max_length=200, trim_whitespace=False), required=False,
+    )
+
     class Meta:
         model = Question
-        fields = ['id', 'text', 'correct_answer']
+        fields = ['id', 'text', 'correct_answer', 'match_type', 'accepted_answers', 'tolerance']
+
+    def validate(self, attrs):
+        # Compile the rule now so a bad pattern or number is a 400, not a grading error
+        rule = {field: attrs.get(field, getattr(self.instance, field, None)) for field in QUESTION_RULE_FIELDS}
+        if rule['correct_answer'] is None:
+            return attrs
+        try:
+            grading.compile_matcher(rule['match_type'] or 'exact', rule['correct_answer'], rule['accepted_answers'], rule['tolerance'])
+        except ValueError as e:
+            raise serializers.ValidationError({'correct_answer': str(e)})
+        return attrs
+
+
+class NestedQuestionSerializer(QuestionSerializer):
+    # Writable so that quiz updates can tell edited questions from new ones
+    id = serializers.IntegerField(required=False)
 
 
 class QuizSerializer(serializers.ModelSerializer):
     created_by = serializers.StringRelatedField(read_only=True)
-    questions = QuestionSerializer(many=True)
+    questions = NestedQuestionSerializer(many=True)
     subject_label = serializers.SerializerMethodField()
 
     class Meta:
@@ -168,6 +222,7 @@ class QuizSerializer(serializers.ModelSerializer):
             'subject',
             'subject_label',
             'duration',
+            'sample_size',
             'created_at',
             'questions',
         ]
@@ -176,20 +231,70 @@ class QuizSerializer(serializers.ModelSerializer):
     def get_subject_label(self, obj):
         return obj.get_subject_display()
 
+    def validate_sample_size(self, value):
+        # Zero would draw no questions and grade every attempt as 0%
+        if value is not None and value < 1:
+            raise serializers.ValidationError('Draw at least one question, or leave empty to use them all.')
+        return value
+
     def create(self, validated_data):
         questions_data = validated_data.pop('questions', [])
-        quiz = Quiz.objects.create(
-            created_by=self.context['request'].user,
-            **validated_data
-        )
-        for question in questions_data:
-            Question.objects.create(quiz=quiz, **question)
+        with transaction.atomic():
+            quiz = Quiz.objects.create(
+                created_by=self.context['request'].user,
+                **validated_data
+            )
+            Question.objects.bulk_create([Question(quiz=quiz, **q) for q in questions_data])
         return quiz
 
+    def update(self, instance, validated_data):
+        '''
+        Questions are replaced as a set: entries with an `id` are updated,
+        entries without one are created and questions left out are deleted.
+        Each of the three is a single bulk query.
+        '''
+        questions_data = validated_data.pop('questions', None)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if questions_data is not None:
+                self._replace_questions(instance, questions_data)
+        return instance
+
+    def _replace_questions(self, quiz, questions_data):
+        existing = {q.pk: q for q in quiz.questions.all()}
+        unknown = sorted({q['id'] for q in questions_data if 'id' in q} - existing.keys())
+        if unknown:
+            raise serializers.ValidationError({'questions': f'Questions {unknown} do not belong to this quiz'})
+
+        created, updated, rules_changed = [], [], False
+        for data in questions_data:
+            question = existing.pop(data.pop('id'), None) if 'id' in data else None
+            if question is None:
+                created.append(Question(quiz=quiz, **data))
+            elif any(getattr(question, field) != value for field, value in data.items()):
+                rule = question.grading_rule()
+                for field, value in data.items():
+                    setattr(question, field, value)
+                rules_changed |= question.grading_rule() != rule
+                updated.append(question)
+
+        if existing:
+            Question.objects.filter(pk__in=existing).delete()
+        Question.objects.bulk_update(updated, QUESTION_FIELDS)
+        Question.objects.bulk_create(created)
+        # Bulk writes send no signals, so drop the cached answer key here
+        # (deleted questions queue their own regrade through post_delete)
+        caching.bump_quiz(quiz.pk)
+        if rules_changed:
+            regrade.schedule(quiz.pk)
+
 
 class SubmissionSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
     quiz = serializers.PrimaryKeyRelatedField(queryset=Quiz.objects.all())
+    feedback = serializers.SerializerMethodField()
+    # Token from POST /quizzes/{id}/start/; required for question-bank quizzes
+    session = serializers.CharField(write_only=True, required=False)
 
     class Meta:
         model = Submission
@@ -198,18 +303,79 @@ class SubmissionSerializer(serializers.ModelSerializer):
             'user',
             'quiz',
             'answers',
+            'session',
             'submitted_at',
             'score',
             'percentage',
             'status',
+            'late',
             'feedback',
         ]
-        read_only_fields = ['submitted_at', 'score', 'percentage', 'status', 'feedback']
+        read_only_fields = ['submitted_at', 'score', 'percentage', 'status', 'late']
+
+    def get_feedback(self, obj):
+        return grading.feedback(obj)
+
+    def validate_answers(self, value):
+        if not isinstance(value, dict) or not all(isinstance(answer, str) for answer in value.values()):
+            raise serializers.ValidationError('Answers must be an object mapping question ids to text.')
+        return value
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+
+class SubmissionListSerializer(SubmissionSerializer):
+    '''Submission without per-question feedback, for list pages.'''
+    class Meta(SubmissionSerializer.Meta):
+        fields = [field for field in SubmissionSerializer.Meta.fields if field != 'feedback']
+
+
+class QuizAttemptSerializer(serializers.ModelSerializer):
+    '''A started attempt with its drawn questions (no answers) and session token.'''
+    questions = serializers.SerializerMethodField()
+    session = serializers.SerializerMethodField()
+    expires_at = serializers.SerializerMethodField()
+
+    class Meta:
+        model = QuizAttempt
+        fields = ['id', 'quiz', 'number', 'started_at', 'expires_at', 'session', 'questions']
+        read_only_fields = fields
+
+    def get_questions(self, obj):
+        return attempts.questions(obj)
+
+    def get_session(self, obj):
+        return attempts.session_token(obj)
+
+    def get_expires_at(self, obj):
+        '''When the quiz's time runs out (before the grace period); None for untimed quizzes.'''
+        session = self.context.get('session')
+        if not session or session['limit'] is None:
+            return None
+        expires = datetime.datetime.fromtimestamp(session['started'] + session['limit'], tz=datetime.timezone.utc)
+        return serializers.DateTimeField().to_representation(expires)
+
+
+class RegradeRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RegradeRun
+        fields = [
+            'id',
+            'quiz',
+            'status',
+            'total',
+            'processed',
+            'changed',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
+
+
 class MentorshipRequestSerializer(serializers.ModelSerializer):
     student = serializers.StringRelatedField(read_only=True)
     mentor = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
@@ -261,6 +427,7 @@ class MoodSerializer(serializers.ModelSerializer):
 
 
 class JournalSerializer(serializers.ModelSerializer):
+    '''Journal without its entry text, for list pages.'''
     user = serializers.StringRelatedField(read_only=True)
 
     class Meta:
@@ -277,6 +444,41 @@ class JournalSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class SyncRecordSerializer(serializers.Serializer):
+    '''One mood or journal entry recorded offline, as sent to the sync endpoint.'''
+    TYPE_CHOICES = ['mood', 'journal']
+
+    type = serializers.ChoiceField(choices=TYPE_CHOICES)
+    key = serializers.CharField(max_length=64, help_text='Client-generated idempotency key, unique per user and type')
+    recorded_at = serializers.DateTimeField(help_text='When the record was made on the device')
+    mood = serializers.CharField(max_length=50, required=False)
+    entry = serializers.CharField(required=False)
+
+    def validate(self, data):
+        field = data['type'] if data['type'] == 'mood' else 'entry'
+        if not data.get(field):
+            raise serializers.ValidationError({field: 'This field is required.'})
+        if data['recorded_at'] > timezone.now() + sync.CLOCK_SKEW:
+            raise serializers.ValidationError({'recorded_at': 'Cannot be in the future.'})
+        return data
+
+
+class JournalSearchResultSerializer(JournalSerializer):
+    '''Journal search hit: the list fields plus a highlighted snippet of the entry.'''
+    snippet = serializers.CharField(read_only=True, allow_null=True)
+
+    class Meta(JournalSerializer.Meta):
+        fields = JournalSerializer.Meta.fields + ['snippet']
+
+
+class JournalDetailSerializer(JournalSerializer):
+    '''Journal with its entry text, for the detail view and writes.'''
+    entry = serializers.CharField()
+
+    class Meta(JournalSerializer.Meta):
+        fields = JournalSerializer.Meta.fields + ['entry']
+
+
 class ForumPostSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)
 
@@ -0,0 +1,45 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Book, Mood, Question
+from . import caching, moodstats, regrade
+
+
+@receiver([post_save, post_delete], sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    caching.bump_books([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_answer_key(sender, instance, **kwargs):
+    caching.bump_quiz(instance.quiz_id)
+
+
+@receiver(post_save, sender=Question)
+def regrade_on_rule_change(sender, instance, created, **kwargs):
+    # New questions do not affect past submissions; see regrade.regrade_rows
+    if not created and instance.grading_rule() != getattr(instance, '_loaded_rule', None):
+        regrade.schedule(instance.quiz_id)
+    instance._loaded_rule = instance.grading_rule()
+
+
+@receiver(post_delete, sender=Question)
+def regrade_on_delete(sender, instance, **kwargs):
+    regrade.schedule(instance.quiz_id)
+
+
+@receiver(post_save, sender=Mood)
+def roll_up_mood(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_mood', None)
+    if created:
+        moodstats.record(instance)
+    elif previous is not None and previous != instance.mood:
+        moodstats.forget(instance, previous)
+        moodstats.record(instance)
+    instance._loaded_mood = instance.mood
+
+
+@receiver(post_delete, sender=Mood)
+def roll_up_mood_delete(sender, instance, **kwargs):
+    moodstats.forget(instance, getattr(instance, '_loaded_mood', None))
@@ -0,0 +1,91 @@
+import datetime
+from collections import Counter
+from django.db import IntegrityError, transaction
+from .models import Journal, Mood
+from . import moodstats
+
+
+# -------------------------
+# Offline Sync
+# -------------------------
+
+# Records accepted per request
+MAX_RECORDS = 500
+
+# How far ahead of the server's clock a device's timestamps may be
+CLOCK_SKEW = datetime.timedelta(minutes=5)
+
+MODELS = {'mood': Mood, 'journal': Journal}
+
+
+def _build(user, kind, data):
+    if kind == 'mood':
+        return Mood(user=user, mood=data['mood'], logged_at=data['recorded_at'], client_key=data['key'])
+    return Journal(user=user, entry=data['entry'], created_at=data['recorded_at'], client_key=data['key'])
+
+
+def _store(user, records):
+    '''
+    Insert the records whose keys the user has not synced before, in one transaction.
+
+    One lookup and one bulk INSERT per type; bulk_create sends no signals, so
+    the mood rollups are written here too.
+    Returns {(type, key): (id, created)}.
+    '''
+    stored = {}
+    with transaction.atomic():
+        for kind, model in MODELS.items():
+            pending = {}
+            for data in records:
+                if data['type'] == kind:
+                    pending.setdefault(data['key'], data)
+            if not pending:
+                continue
+            existing = dict(model.objects.filter(user=user, client_key__in=list(pending)).values_list('client_key', 'pk'))
+            stored.update({(kind, key): (pk, False) for key, pk in existing.items()})
+            new = model.objects.bulk_create([_build(user, kind, data) for key, data in pending.items() if key not in existing])
+            stored.update({(kind, obj.client_key): (obj.pk, True) for obj in new})
+            if kind == 'mood':
+                moodstats.record_many(new)
+    return stored
+
+
+def apply(user, records):
+    '''
+    Save a batch of offline records for the user; returns per-record results and totals.
+
+    `records` are bound SyncRecordSerializers. Invalid records are reported
+    and skipped, the rest are saved together. A key already synced, earlier
+    or in the same batch, is reported as a duplicate with the id it was saved
+    under, so replaying a batch after a dropped connection is harmless.
+    '''
+    valid = [record.validated_data for record in records if record.is_valid()]
+    try:
+        stored = _store(user, valid)
+    except IntegrityError:
+        # A concurrent replay of the same batch saved some keys first; they are duplicates now
+        stored = _store(user, valid)
+
+    results, seen = [], set()
+    for record in records:
+        if record.errors:
+            key = record.initial_data.get('key') if isinstance(record.initial_data, dict) else None
+            results.append({'key': key, 'status': 'invalid', 'errors': record.errors})
+            continue
+        ident = (record.validated_data['type'], record.validated_data['key'])
+        pk, created = stored[ident]
+        results.append({
+            'key': ident[1],
+            'type': ident[0],
+            'status': 'created' if created and ident not in seen else 'duplicate',
+            'id': pk,
+        })
+        seen.add(ident)
+
+    totals = Counter(result['status'] for result in results)
+    return {
+        'created': totals['created'],
+        'duplicates': totals['duplicate'],
+        'invalid': totals['invalid'],
+        'results': results,
+    }
@@ -0,0 +1,696 @@
+from django.core.cache import cache
+import datetime
+import io
+from unittest import mock
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from django.utils import timezone
+from .models import User, Quiz, Question, Submission, GradingJob, QuizStats, LeaderboardEntry, RegradeRun, QuizAttempt
+from . import attempts, caching, grading, itemanalysis, quizstats, regrade
+
+# Tests clear the cache, so they get their own instead of the shared file cache
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests'}}
+
+
+class QuizFixtureMixin:
+    def setUp(self):
+        self.enterContext(override_settings(CACHES=TEST_CACHES))
+        cache.clear()
+        self.mentor = User.objects.create(username='mentor', email='mentor@example.com', role='mentor')
+        self.student = User.objects.create(username='student1', email='student1@example.com', role='student')
+        # Untimed, so submissions need no session unless a test starts one
+        self.quiz = Quiz.objects.create(title='Capitals', created_by=self.mentor, duration=0)
+        self.questions = [
+            Question.objects.create(quiz=self.quiz, text='Capital of Ghana?', correct_answer='Accra'),
+            Question.objects.create(quiz=self.quiz, text='Capital of Kenya?', correct_answer='Nairobi'),
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+
+class GradingTestCase(QuizFixtureMixin, TestCase):
+    def submit(self, *answers):
+        payload = {'quiz': self.quiz.pk, 'answers': {str(q.pk): a for q, a in zip(self.questions, answers)}}
+        response = self.client.post('/api/submissions/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_grades_and_stores_feedback(self):
+        data = self.submit('Accra', 'Mombasa')
+        self.assertEqual((data['score'], data['percentage'], data['status']), (1, 50, 'pass'))
+        self.assertEqual(data['feedback'][1], {
+            'question_id': self.questions[1].pk,
+            'question': 'Capital of Kenya?',
+            'your_answer': 'Mombasa',
+            'correct_answer': 'Nairobi',
+            'is_correct': False,
+        })
+        self.assertEqual(Submission.objects.get().score, 1)
+
+    def test_answer_key_is_compiled_once(self):
+        self.submit('Accra', 'Nairobi')
+        # Quiz lookup, the submission insert and the stats bookkeeping; no question queries
+        with self.assertNumQueries(10):
+            self.submit('Accra', 'Nairobi')
+
+    def test_question_changes_drop_the_answer_key(self):
+        self.submit('Accra', 'Nairobi')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[1].correct_answer = 'Mombasa'
+            self.questions[1].save()
+        self.assertEqual(self.submit('Accra', 'Nairobi')['score'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions.pop().delete()
+        self.assertEqual(self.submit('Accra')['percentage'], 100)
+
+
+    def test_feedback_is_stored_compactly_and_rebuilt(self):
+        data = self.submit('Lagos', 'Nairobi')
+        submission = Submission.objects.get()
+        self.assertEqual(submission.question_ids, [q.pk for q in self.questions])
+        self.assertEqual(bytes(submission.correctness), bytes([0b01000000]))
+        self.assertEqual([f['is_correct'] for f in data['feedback']], [False, True])
+
+        deleted_id = self.questions[0].pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.questions[0].delete()
+        feedback = self.client.get(f'/api/submissions/{submission.pk}/').data['feedback']
+        self.assertEqual(
+            [(f['question_id'], f['question'], f['your_answer'], f['is_correct']) for f in feedback],
+            [(deleted_id, None, 'Lagos', False),
+             (self.questions[1].pk, 'Capital of Kenya?', 'Nairobi', True)],
+        )
+
+    def test_list_leaves_out_feedback(self):
+        self.submit('Accra', 'Nairobi')
+        results = self.client.get('/api/submissions/').data['results']
+        self.assertNotIn('feedback', results[0])
+        self.assertEqual(results[0]['score'], 2)
+
+    def test_bitmaps_match_numpy_bit_order(self):
+        flags = [True, False, True] * 7
+        packed = grading.pack_bits(flags)
+        self.assertEqual(packed, np.packbits(flags).tobytes())
+        self.assertEqual(grading.unpack_bits(packed, len(flags)), flags)
+
+
+@override_settings(ASYNC_GRADING=True)
+class AsyncGradingTestCase(QuizFixtureMixin, TransactionTestCase):
+    '''Workers run in their own threads and connections, so data must be committed.'''
+
+    def submit_async(self, *answers):
+        payload = {'quiz': self.quiz.pk, 'answers': {str(q.pk): a for q, a in zip(self.questions, answers)}}
+        response = self.client.post('/api/submissions/', payload, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+        return response.data['id']
+
+    def test_workers_grade_queued_submissions(self):
+        ids = [self.submit_async('Accra', 'Nairobi'), self.submit_async('Lagos', 'Nairobi')]
+        self.assertEqual(GradingJob.objects.count(), 2)
+        call_command('run_grading_workers', workers=1, batch_size=1, drain=True, stdout=io.StringIO())
+        self.assertFalse(GradingJob.objects.exists())
+        graded = Submission.objects.in_bulk(ids)
+        self.assertEqual([graded[pk].score for pk in ids], [2, 1])
+        self.assertEqual(graded[ids[1]].status, 'pass')
+
+    def test_claims_are_exclusive(self):
+        for _ in range(3):
+            self.submit_async('Accra', 'Nairobi')
+        _, first = grading.claim_jobs(2)
+        _, second = grading.claim_jobs(2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({s.pk for s in first} & {s.pk for s in second})
+        self.assertEqual(grading.claim_jobs(2)[1], [])
+
+    def test_stale_worker_does_not_count_reclaimed_jobs(self):
+        self.submit_async('Accra', 'Nairobi')
+        self.submit_async('Lagos', 'Nairobi')
+        token, slow = grading.claim_jobs(2)
+        GradingJob.objects.update(claimed_at=timezone.now() - grading.CLAIM_TIMEOUT - datetime.timedelta(seconds=1))
+        self.assertEqual(grading.grade_pending(), 2)
+        self.assertEqual(grading.finish_jobs(token, slow), 0)
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.attempts, stats.total_score), (2, 3))
+
+    def test_result_long_poll(self):
+        submission_id = self.submit_async('Accra', 'Nairobi')
+        response = self.client.get(f'/api/submissions/{submission_id}/result/')
+        self.assertEqual(response.data['status'], 'pending')
+        grading.grade_pending()
+        response = self.client.get(f'/api/submissions/{submission_id}/result/', {'wait': 5})
+        self.assertEqual((response.data['status'], response.data['score']), ('pass', 2))
+
+    def test_answers_must_be_an_object_of_text(self):
+        for answers in (['Accra'], {str(self.questions[0].pk): 5}):
+            response = self.client.post('/api/submissions/', {'quiz': self.quiz.pk, 'answers': answers}, format='json')
+            self.assertEqual(response.status_code, 400, answers)
+        self.assertFalse(GradingJob.objects.exists())
+
+    def test_ungradable_jobs_fail_after_max_attempts(self):
+        # Written around the serializer, as older rows may be
+        broken = Submission.objects.create(user=self.student, quiz=self.quiz, answers=['Accra'], status='pending')
+        GradingJob.objects.create(submission=broken)
+        good = self.submit_async('Accra', 'Nairobi')
+        with self.assertLogs('core.grading', 'ERROR'):
+            self.assertEqual(grading.grade_pending(), 1)
+        self.assertEqual(Submission.objects.get(pk=good).score, 2)
+        for _ in range(grading.MAX_ATTEMPTS - 1):
+            GradingJob.objects.update(claimed_at=timezone.now() - grading.CLAIM_TIMEOUT - datetime.timedelta(seconds=1))
+            with self.assertLogs('core.grading', 'ERROR'):
+                grading.grade_pending()
+        GradingJob.objects.update(claimed_at=timezone.now() - grading.CLAIM_TIMEOUT - datetime.timedelta(seconds=1))
+        self.assertEqual(grading.claim_jobs(10)[1], [])
+        job = GradingJob.objects.get()
+        self.assertEqual((job.submission_id, job.attempts), (broken.pk, grading.MAX_ATTEMPTS))
+        self.assertIsNotNone(job.failed_at)
+
+    def test_workers_survive_a_failing_batch(self):
+        self.submit_async('Accra', 'Nairobi')
+        real = grading.grade_pending
+        calls = []
+
+        def flaky(batch_size):
+            calls.append(batch_size)
+            if len(calls) == 1:
+                raise RuntimeError('database went away')
+            return real(batch_size)
+
+        out = io.StringIO()
+        with mock.patch.object(grading, 'grade_pending', flaky), \
+                self.assertLogs('core.management.commands.run_grading_workers', 'ERROR'):
+            call_command('run_grading_workers', workers=1, drain=True, stdout=out)
+        self.assertIn('1 submissions graded', out.getvalue())
+        self.assertFalse(GradingJob.objects.exists())
+
+
+class QuizNestedWriteTestCase(QuizFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.mentor)
+
+    def test_create_inserts_questions_in_bulk(self):
+        payload = {
+            'title': 'Rivers',
+            'questions': [{'text': f'River {n}?', 'correct_answer': f'R{n}'} for n in range(20)],
+        }
+        # Savepoint, quiz insert, one bulk question insert, release, read back for the response
+        with self.assertNumQueries(5):
+            response = self.client.post('/api/quizzes/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['questions']), 20)
+        self.assertEqual(Question.objects.filter(quiz_id=response.data['id']).count(), 20)
+
+    def test_update_diffs_questions(self):
+        kept, dropped = self.questions
+        payload = {
+            'title': 'Capitals',
+            'questions': [
+                {'id': kept.pk, 'text': kept.text, 'correct_answer': 'ACCRA'},
+                {'text': 'Capital of Togo?', 'correct_answer': 'Lome'},
+            ],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f'/api/quizzes/{self.quiz.pk}/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(q['id'] == kept.pk, q['correct_answer']) for q in response.data['questions']],
+            [(True, 'ACCRA'), (False, 'Lome')],
+        )
+        self.assertFalse(Question.objects.filter(pk=dropped.pk).exists())
+        # The compiled answer key follows the new questions
+        self.assertEqual([a for _, _, a, _ in grading.answer_key(self.quiz.pk)], ['ACCRA', 'Lome'])
+
+    def test_update_rejects_foreign_questions(self):
+        other = Quiz.objects.create(title='Other', created_by=self.mentor)
+        stranger = Question.objects.create(quiz=other, text='?', correct_answer='!')
+        payload = {'title': 'Capitals', 'questions': [{'id': stranger.pk, 'text': 'x', 'correct_answer': 'y'}]}
+        response = self.client.put(f'/api/quizzes/{self.quiz.pk}/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Question.objects.get(pk=stranger.pk).text, '?')
+        self.assertEqual(self.quiz.questions.count(), 2)
+
+    def test_partial_update_leaves_questions_alone(self):
+        response = self.client.patch(f'/api/quizzes/{self.quiz.pk}/', {'title': 'World capitals'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quiz.questions.count(), 2)
+
+    def test_list_runs_constant_queries(self):
+        for n in range(10):
+            quiz = Quiz.objects.create(title=f'Quiz {n}', created_by=self.mentor)
+            Question.objects.bulk_create([Question(quiz=quiz, text='?', correct_answer='!') for _ in range(3)])
+        # Count, quizzes with their authors, questions for the page
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/quizzes/')
+        self.assertEqual(response.data['count'], 11)
+
+
+class QuizStatsTestCase(QuizFixtureMixin, TestCase):
+    def submit_as(self, user, *answers):
+        self.client.force_authenticate(user)
+        payload = {'quiz': self.quiz.pk, 'answers': {str(q.pk): a for q, a in zip(self.questions, answers)}}
+        self.assertEqual(self.client.post('/api/submissions/', payload, format='json').status_code, 201)
+
+    def make_students(self, count):
+        return [
+            User.objects.create(username=f'pupil{n}', email=f'pupil{n}@example.com', role='student')
+            for n in range(count)
+        ]
+
+    def test_stats_follow_each_graded_submission(self):
+        self.submit_as(self.student, 'Accra', 'Nairobi')
+        self.submit_as(self.student, 'Lagos', 'Lagos')
+        self.submit_as(self.student, 'Accra', 'Lagos')
+        self.client.force_authenticate(self.mentor)
+        with self.assertNumQueries(1):
+            data = self.client.get(f'/api/quizzes/{self.quiz.pk}/stats/').data
+        self.assertEqual(
+            (data['attempts'], data['passes'], data['pass_rate'], data['average_score'], data['average_percentage']),
+            (3, 2, 0.667, 1.0, 50.0),
+        )
+
+    def test_stats_are_for_mentors(self):
+        self.assertEqual(self.client.get(f'/api/quizzes/{self.quiz.pk}/stats/').status_code, 403)
+        self.client.force_authenticate(self.mentor)
+        self.assertEqual(self.client.get(f'/api/quizzes/{self.quiz.pk}/stats/').data['attempts'], 0)
+        self.assertEqual(self.client.get('/api/quizzes/999/stats/').status_code, 404)
+
+    def test_leaderboard_keeps_each_students_best_and_stays_bounded(self):
+        students = self.make_students(quizstats.LEADERBOARD_SIZE + 2)
+        for student in students[:-1]:
+            self.submit_as(student, 'Accra', 'Lagos')
+        self.submit_as(students[0], 'Accra', 'Nairobi')
+        self.submit_as(students[0], 'Lagos', 'Lagos')
+        self.submit_as(students[-1], 'Accra', 'Nairobi')
+        self.assertEqual(LeaderboardEntry.objects.filter(quiz=self.quiz).count(), quizstats.LEADERBOARD_SIZE)
+
+        entries = self.client.get(f'/api/quizzes/{self.quiz.pk}/leaderboard/').data['entries']
+        self.assertEqual([e['user'] for e in entries[:2]], ['pupil0', students[-1].username])
+        self.assertEqual([e['percentage'] for e in entries], [100, 100] + [50] * (quizstats.LEADERBOARD_SIZE - 2))
+        # Earliest of the tied 50% attempts win the remaining places
+        self.assertEqual([e['user'] for e in entries[2:]], [s.username for s in students[1:quizstats.LEADERBOARD_SIZE - 1]])
+        limited = self.client.get(f'/api/quizzes/{self.quiz.pk}/leaderboard/', {'limit': 1}).data['entries']
+        self.assertEqual([e['rank'] for e in limited], [1])
+
+    def test_async_grading_updates_stats(self):
+        submission = Submission.objects.create(
+            user=self.student, quiz=self.quiz, status='pending',
+            answers={str(self.questions[0].pk): 'Accra'},
+        )
+        grading.enqueue(submission)
+        grading.grade_pending()
+        stats = QuizStats.objects.get(quiz=self.quiz)
+        self.assertEqual((stats.attempts, stats.passes, stats.total_percentage), (1, 1, 50))
+
+    def test_rebuild_matches_incremental_state(self):
+        students = self.make_students(4)
+        for n, student in enumerate(students):
+            self.submit_as(student, 'Accra', 'Nairobi' if n % 2 else 'Lagos')
+        self.submit_as(students[0], 'Accra', 'Nairobi')
+        expected_stats = list(QuizStats.objects.values('quiz', 'attempts', 'passes', 'total_score', 'total_percentage'))
+        expected_board = quizstats.leaderboard(self.quiz.pk)
+
+        QuizStats.objects.update(attempts=0)
+        LeaderboardEntry.objects.all().delete()
+        call_command('rebuild_quiz_stats', stdout=io.StringIO())
+        self.assertEqual(
+            list(QuizStats.objects.values('quiz', 'attempts', 'passes', 'total_score', 'total_percentage')),
+            expected_stats,
+        )
+        self.assertEqual(quizstats.leaderboard(self.quiz.pk), expected_board)
+
+
+class ItemAnalysisTestCase(QuizFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.questions.append(
+            Question.objects.create(quiz=self.quiz, text='Capital of Mali?', correct_answer='Bamako')
+        )
+        sheets = [
+            ('Accra', 'Nairobi', 'Bamako'),
+            ('Accra', 'Nairobi', 'x'),
+            ('Accra', 'x', 'x'),
+            ('Accra', 'x', 'Bamako'),
+            ('x', 'x', 'x'),
+        ]
+        key = grading.answer_key(self.quiz.pk)
+        Submission.objects.bulk_create([
+            Submission(user=self.student, quiz=self.quiz, **grading.grade(
+                {str(q.pk): a for q, a in zip(self.questions, sheet)}, key,
+            ))
+            for sheet in sheets
+        ])
+        Submission.objects.create(user=self.student, quiz=self.quiz, status='pending')
+        self.client.force_authenticate(self.mentor)
+
+    def test_matrix_is_filled_across_chunks(self):
+        _, _, matrix, seen = itemanalysis.correctness_matrix(self.quiz.pk, chunk_size=2)
+        self.assertEqual(matrix.astype(int).tolist(), [[1, 1, 1], [1, 1, 0], [1, 0, 0], [1, 0, 1], [0, 0, 0]])
+        self.assertTrue(seen.all())
+
+    def test_difficulty_discrimination_and_distribution(self):
+        data = self.client.get(f'/api/quizzes/{self.quiz.pk}/item-analysis/').data
+        self.assertEqual(data['submissions'], 5)
+        self.assertEqual([q['difficulty'] for q in data['questions']], [0.8, 0.4, 0.4])
+        self.assertEqual(data['scores']['distribution'], [1, 1, 2, 1])
+        self.assertEqual(data['scores']['mean'], 1.6)
+
+        _, _, matrix, _ = itemanalysis.correctness_matrix(self.quiz.pk)
+        matrix = matrix.astype(float)
+        for j, question in enumerate(data['questions']):
+            rest = matrix.sum(axis=1) - matrix[:, j]
+            self.assertAlmostEqual(question['discrimination'], np.corrcoef(matrix[:, j], rest)[0, 1], places=3)
+
+    def test_questions_not_drawn_are_left_out(self):
+        Submission.objects.all().delete()
+        key = grading.answer_key(self.quiz.pk)
+        ghana, kenya, mali = (str(q.pk) for q in self.questions)
+        draws = [
+            ({ghana: 'Accra', kenya: 'Nairobi'}, [0, 1]),
+            ({ghana: 'Accra', mali: 'x'}, [0, 2]),
+            ({kenya: 'x', mali: 'x'}, [1, 2]),
+            ({kenya: 'Nairobi', mali: 'Bamako'}, [1, 2]),
+            ({ghana: 'x', mali: 'x'}, [0, 2]),
+        ]
+        Submission.objects.bulk_create([
+            Submission(user=self.student, quiz=self.quiz, **grading.grade(
+                answers, grading.select(key, [self.questions[j].pk for j in drawn]),
+            ))
+            for answers, drawn in draws
+        ])
+        data = self.client.get(f'/api/quizzes/{self.quiz.pk}/item-analysis/').data
+        self.assertEqual([q['presented'] for q in data['questions']], [3, 3, 4])
+        self.assertEqual([q['difficulty'] for q in data['questions']], [0.667, 0.667, 0.25])
+
+        _, _, matrix, seen = itemanalysis.correctness_matrix(self.quiz.pk)
+        self.assertEqual(seen.sum(axis=1).tolist(), [2] * 5)
+        matrix = matrix.astype(float)
+        for j, question in enumerate(data['questions']):
+            given = seen[:, j]
+            rest = matrix.sum(axis=1)[given] - matrix[given, j]
+            self.assertAlmostEqual(question['discrimination'], np.corrcoef(matrix[given, j], rest)[0, 1], places=3)
+
+    def test_undefined_statistics_are_null(self):
+        Submission.objects.all().delete()
+        data = self.client.get(f'/api/quizzes/{self.quiz.pk}/item-analysis/').data
+        self.assertEqual((data['submissions'], data['scores']['distribution']), (0, [0, 0, 0, 0]))
+        self.assertIsNone(data['questions'][0]['discrimination'])
+
+    def test_mentors_only(self):
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(f'/api/quizzes/{self.quiz.pk}/item-analysis/').status_code, 403)
+
+
+class AnswerMatcherTestCase(QuizFixtureMixin, TestCase):
+    def test_rules(self):
+        cases = [
+            (('exact', 'Paris'), {'Paris': True, 'paris': False, 'Paris ': False}),
+            (('text', ' New  York'), {'new york': True, 'NEW YORK  ': True, 'newyork': False, None: False}),
+            (('numeric', '3.14', [], 0.01), {'3.141': True, ' 3.15 ': True, 3.13: True, '3.2': False, 'pi': False}),
+            (('regex', r'(?i)colou?r'), {'Color': True, ' colour ': True, 'colours': False}),
+            (('text', 'Kyiv', ['Kiev']), {'kiev': True, 'KYIV': True, 'Moscow': False}),
+        ]
+        for rule, answers in cases:
+            matches = grading.compile_matcher(*rule)
+            for answer, expected in answers.items():
+                self.assertEqual(matches(answer), expected, (rule, answer))
+
+    def test_grading_uses_each_questions_rule(self):
+        self.questions[0].match_type = 'text'
+        self.questions[0].save()
+        self.questions[1].accepted_answers = ['Nairobi City']
+        self.questions[1].save()
+        key = grading.compile_matchers(grading.compile_answer_key(self.quiz.pk))
+        self.assertEqual(grading.grade({str(self.questions[0].pk): 'accra ', str(self.questions[1].pk): 'Nairobi City'}, key)['score'], 2)
+
+    def test_invalid_rules_are_rejected(self):
+        self.client.force_authenticate(self.mentor)
+        for question in [
+            {'text': '?', 'correct_answer': '(', 'match_type': 'regex'},
+            {'text': '?', 'correct_answer': 'ten', 'match_type': 'numeric'},
+            {'text': '?', 'correct_answer': '10', 'match_type': 'numeric', 'tolerance': -1},
+        ]:
+            response = self.client.post('/api/quizzes/', {'title': 'Bad', 'questions': [question]}, format='json')
+            self.assertEqual(response.status_code, 400, question)
+        self.assertEqual(Quiz.objects.count(), 1)
+
+    def test_rule_changes_regrade_new_submissions(self):
+        self.client.force_authenticate(self.mentor)
+        payload = {'title': 'Capitals', 'questions': [
+            {'id': self.questions[0].pk, 'text': 'Capital of Ghana?', 'correct_answer': 'Accra', 'match_type': 'text'},
+            {'id': self.questions[1].pk, 'text': 'Capital of Kenya?', 'correct_answer': 'Nairobi'},
+        ]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.put(f'/api/quizzes/{self.quiz.pk}/', payload, format='json').status_code, 200)
+        self.assertEqual(Question.objects.get(pk=self.questions[0].pk).match_type, 'text')
+        self.client.force_authenticate(self.student)
+        payload = {'quiz': self.quiz.pk, 'answers': {str(self.questions[0].pk): 'ACCRA', str(self.questions[1].pk): 'nairobi'}}
+        self.assertEqual(self.client.post('/api/submissions/', payload, format='json').data['score'], 1)
+
+
+class RegradeTestCase(QuizFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # Ghana's capital was keyed as 'Kumasi' by mistake
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.filter(pk=self.questions[0].pk).update(correct_answer='Kumasi')
+            caching.bump_quiz(self.quiz.pk)
+        for sheet in [('Accra', 'Nairobi'), ('Kumasi', 'Nairobi'), ('Accra', 'Lagos')]:
+            self.submit(*sheet)
+
+    def submit(self, *answers):
+        payload = {'quiz': self.quiz.pk, 'answers': {str(q.pk): a for q, a in zip(self.questions, answers)}}
+        self.client.post('/api/submissions/', payload, format='json')
+
+    def fix_key(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.get(pk=self.questions[0].pk)
+            question.correct_answer = 'Accra'
+            question.save()
+
+    def scores(self):
+        return list(Submission.objects.order_by('pk').values_list('score', 'status'))
+
+    def test_key_fix_queues_and_applies_a_regrade(self):
+        self.assertEqual(self.scores(), [(1, 'pass'), (2, 'pass'), (0, 'fail')])
+        self.fix_key()
+        self.assertEqual(RegradeRun.objects.get().status, 'pending')
+        self.assertEqual(regrade.process_next(processes=1), 3)
+        self.assertEqual(self.scores(), [(2, 'pass'), (1, 'pass'), (1, 'pass')])
+        run = RegradeRun.objects.get()
+        self.assertEqual((run.status, run.processed, run.changed), ('done', 3, 3))
+        # Stats are rebuilt from the new scores
+        self.assertEqual(QuizStats.objects.get(quiz=self.quiz).passes, 3)
+
+    def test_only_rule_changes_queue_a_regrade(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.get(pk=self.questions[1].pk)
+            question.text = 'What is the capital of Kenya?'
+            question.save()
+            Question.objects.create(quiz=self.quiz, text='Capital of Mali?', correct_answer='Bamako')
+        self.assertFalse(RegradeRun.objects.exists())
+
+    def test_new_questions_do_not_count_against_old_submissions(self):
+        self.fix_key()
+        with self.captureOnCommitCallbacks(execute=True):
+            Question.objects.create(quiz=self.quiz, text='Capital of Mali?', correct_answer='Bamako')
+        regrade.process_next(processes=1)
+        self.assertEqual(Submission.objects.order_by('pk').first().percentage, 100)
+
+    def test_interrupted_run_resumes_from_its_cursor(self):
+        self.fix_key()
+        run = regrade.claim_run()
+
+        def crash(run):
+            raise KeyboardInterrupt
+        with self.assertRaises(KeyboardInterrupt):
+            regrade.execute(run, chunk_size=1, progress=crash)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.processed), ('running', 1))
+        self.assertIsNone(regrade.claim_run())
+
+        RegradeRun.objects.update(heartbeat_at=timezone.now() - regrade.STALE_AFTER * 2)
+        out = io.StringIO()
+        call_command('regrade_quiz', self.quiz.pk, processes=1, chunk_size=1, stdout=out)
+        self.assertIn(f'after submission {run.cursor}', out.getvalue())
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.processed, run.total), ('done', 3, 3))
+        self.assertEqual(self.scores(), [(2, 'pass'), (1, 'pass'), (1, 'pass')])
+
+    def test_stale_worker_cannot_overwrite_a_taken_over_run(self):
+        self.fix_key()
+        run = regrade.claim_run()
+        RegradeRun.objects.update(heartbeat_at=timezone.now() - regrade.STALE_AFTER * 2)
+        self.assertIsNotNone(regrade.claim_run())
+        with self.assertRaises(regrade.LostClaim):
+            regrade.execute(run)
+        self.assertEqual(self.scores(), [(1, 'pass'), (2, 'pass'), (0, 'fail')])
+
+    def test_failed_runs_are_logged(self):
+        self.fix_key()
+        with mock.patch.object(regrade, 'regrade_rows', side_effect=ValueError('bad rule')), \
+                self.assertLogs('core.regrade', 'ERROR') as logs:
+            self.assertEqual(regrade.process_next(processes=1), 0)
+        self.assertIn('failed', logs.output[0])
+        self.assertEqual(RegradeRun.objects.get().status, 'failed')
+
+    def test_regrade_endpoint(self):
+        self.client.force_authenticate(self.mentor)
+        url = f'/api/quizzes/{self.quiz.pk}/regrade/'
+        self.assertEqual(self.client.get(url).data, {'status': None})
+        response = self.client.post(url)
+        self.assertEqual((response.status_code, response.data['status']), (202, 'pending'))
+        regrade.process_next(processes=1)
+        self.assertEqual(self.client.get(url).data['status'], 'done')
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+
+class QuestionBankTestCase(QuizFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.bank = Quiz.objects.create(title='Rivers', created_by=self.mentor, sample_size=3)
+        self.bank_questions = Question.objects.bulk_create([
+            Question(quiz=self.bank, text=f'River {i}?', correct_answer=f'R{i}') for i in range(10)
+        ])
+        self.other = User.objects.create(username='student2', email='student2@example.com', role='student')
+
+    def start(self, user=None):
+        self.client.force_authenticate(user or self.student)
+        response = self.client.post(f'/api/quizzes/{self.bank.pk}/start/')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def submit_all_correct(self, drawn):
+        by_id = {q.pk: q.correct_answer for q in self.bank_questions}
+        answers = {str(q['id']): by_id[q['id']] for q in drawn['questions']}
+        payload = {'quiz': self.bank.pk, 'answers': answers, 'session': drawn['session']}
+        return self.client.post('/api/submissions/', payload, format='json')
+
+    def test_sample_size_must_draw_a_question(self):
+        self.client.force_authenticate(self.mentor)
+        payload = {'title': 'Lakes', 'sample_size': 0, 'questions': [{'text': 'Lake?', 'correct_answer': 'Volta'}]}
+        response = self.client.post('/api/quizzes/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sample_size', response.data)
+        payload['sample_size'] = 1
+        self.assertEqual(self.client.post('/api/quizzes/', payload, format='json').status_code, 201)
+
+    def test_start_draws_a_reproducible_sample_without_answers(self):
+        drawn = self.start()
+        self.assertEqual(len(drawn['questions']), 3)
+        self.assertNotIn('correct_answer', drawn['questions'][0])
+        # Starting again before submitting resumes the same attempt and clock
+        self.assertEqual(self.start(), drawn)
+        attempt = QuizAttempt.objects.get()
+        self.assertEqual(
+            attempts.draw(grading.answer_key(self.bank.pk), 3, attempt.seed),
+            [q['id'] for q in drawn['questions']],
+        )
+
+    def test_students_get_independent_draws(self):
+        draws = {tuple(q['id'] for q in self.start(user)['questions']) for user in [self.student, self.other]}
+        seeds = set(QuizAttempt.objects.values_list('seed', flat=True))
+        self.assertEqual(len(seeds), 2)
+        self.assertTrue(all(len(d) == 3 for d in draws))
+
+    def test_draw_does_not_sort_randomly_in_the_database(self):
+        grading.answer_key(self.bank.pk)
+        # Quiz, open attempt, last number, then the insert in its savepoint
+        with self.assertNumQueries(6) as queries:
+            self.start()
+        self.assertFalse(any('RANDOM' in q['sql'].upper() for q in queries.captured_queries))
+
+    def test_grading_covers_only_the_drawn_questions(self):
+        drawn = self.start()
+        response = self.submit_all_correct(drawn)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['score'], response.data['percentage']), (3, 100))
+        self.assertEqual([item['question_id'] for item in response.data['feedback']], [q['id'] for q in drawn['questions']])
+        self.assertEqual(QuizAttempt.objects.get().submission_id, response.data['id'])
+        # The next attempt gets a fresh draw
+        self.assertEqual(self.start()['number'], 2)
+
+    def test_submitting_without_starting_is_rejected(self):
+        response = self.client.post('/api/submissions/', {'quiz': self.bank.pk, 'answers': {}}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Submission.objects.exists())
+
+
+class TimedSessionTestCase(QuizFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        Quiz.objects.filter(pk=self.quiz.pk).update(duration=10)
+
+    def start(self):
+        response = self.client.post(f'/api/quizzes/{self.quiz.pk}/start/')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def submit(self, session, **extra):
+        answers = {str(self.questions[0].pk): 'Accra', str(self.questions[1].pk): 'Nairobi'}
+        payload = {'quiz': self.quiz.pk, 'answers': answers, 'session': session, **extra}
+        return self.client.post('/api/submissions/', payload, format='json')
+
+    def after(self, seconds):
+        # Move the session clock without touching the database
+        return mock.patch('core.attempts.time.time', return_value=timezone.now().timestamp() + seconds)
+
+    def test_submission_in_time_is_checked_from_the_cache(self):
+        started = self.start()
+        window = datetime.datetime.fromisoformat(started['expires_at']) - datetime.datetime.fromisoformat(started['started_at'])
+        self.assertEqual(window, datetime.timedelta(minutes=10))
+        grading.answer_key(self.quiz.pk)
+        # The session is checked from the cache: the only extra query is linking the attempt
+        with self.assertNumQueries(13) as queries:
+            response = self.submit(started['session'])
+        self.assertFalse(any(q['sql'].startswith('SELECT "core_quizattempt"') for q in queries.captured_queries))
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.data['late'])
+
+    def test_submission_in_grace_period_is_flagged_late(self):
+        started = self.start()
+        with self.after(10 * 60 + 5):
+            response = self.submit(started['session'])
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.data['late'])
+        self.assertTrue(Submission.objects.get().late)
+
+    def test_submission_after_time_is_up_is_rejected(self):
+        started = self.start()
+        with self.after(10 * 60 + 31):
+            response = self.submit(started['session'])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_lost_session_falls_back_to_the_attempt(self):
+        started = self.start()
+        cache.clear()
+        self.assertEqual(self.submit(started['session']).status_code, 201)
+
+    def test_session_is_single_use_and_bound_to_its_student(self):
+        started = self.start()
+        other = User.objects.create(username='student2', email='student2@example.com', role='student')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.submit(started['session']).status_code, 400)
+        self.client.force_authenticate(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.submit(started['session']).status_code, 201)
+        self.assertEqual(self.submit(started['session']).status_code, 400)
+        self.assertEqual(self.submit(started['session'][:-2] + 'xx').status_code, 400)
+        self.assertEqual(Submission.objects.count(), 1)
+
+    def test_timed_quizzes_require_a_session(self):
+        response = self.client.post('/api/submissions/', {'quiz': self.quiz.pk, 'answers': {}}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Start the quiz first')
+        self.assertFalse(Submission.objects.exists())
+
+    @override_settings(QUIZ_SESSIONS_REQUIRED=True)
+    def test_sessions_can_be_required(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(duration=0)
+        response = self.client.post('/api/submissions/', {'quiz': self.quiz.pk, 'answers': {}}, format='json')
+        self.assertEqual(response.status_code, 400)
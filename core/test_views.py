@@ -0,0 +1,54 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+from .models import User, Book, ForumPost
+
+
+class PaginationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='student1', email='student1@example.com', role='student')
+        ForumPost.objects.bulk_create(
+            ForumPost(user=self.user, title=f'Post {n}', content='...') for n in range(125)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_page_numbers_by_default(self):
+        response = self.client.get('/api/forum/')
+        self.assertEqual(response.data['count'], 125)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_page_size_is_capped(self):
+        response = self.client.get('/api/forum/', {'page_size': 20})
+        self.assertEqual(len(response.data['results']), 20)
+        response = self.client.get('/api/forum/', {'page_size': 10_000, 'pagination': 'cursor'})
+        self.assertEqual(len(response.data['results']), 100)
+
+    def test_cursor_pagination_walks_every_row_once(self):
+        seen = []
+        url, params = '/api/forum/', {'pagination': 'cursor', 'page_size': 7}
+        with self.assertNumQueries(1):
+            response = self.client.get(url, params)
+        self.assertNotIn('count', response.data)
+        while True:
+            seen += [post['id'] for post in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(seen), 125)
+        self.assertEqual(len(set(seen)), 125)
+
+    def test_books_paginate_by_title(self):
+        Book.objects.bulk_create(
+            Book(title=f'Book {n:03d}', author='Someone', isbn=f'{n:013d}', published_date='2000-01-01') for n in range(25)
+        )
+        response = self.client.get('/api/books/', {'pagination': 'cursor', 'page_size': 20})
+        titles = [book['title'] for book in response.data['results']]
+        response = self.client.get(response.data['next'])
+        titles += [book['title'] for book in response.data['results']]
+        self.assertEqual(titles, [f'Book {n:03d}' for n in range(25)])
+
+    def test_search_results_cannot_use_cursors(self):
+        for url in ('/api/books/', '/api/journals/'):
+            response = self.client.get(url, {'q': 'post', 'pagination': 'cursor'})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(self.client.get(url, {'q': 'post'}).status_code, 200)
@@ -0,0 +1,266 @@
+import datetime
+import io
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .models import User, Journal, Mood, MoodRollup
+from . import moodstats
+
+# Tests clear the cache, so they get their own instead of the shared file cache
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests'}}
+
+
+class MoodRollupTestCase(TestCase):
+    def setUp(self):
+        self.student = User.objects.create(username='student1', email='student1@example.com', role='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def log(self, mood, when):
+        entry = Mood.objects.create(user=self.student, mood=mood)
+        # logged_at is auto_now_add; backdate without touching the rollups
+        Mood.objects.filter(pk=entry.pk).update(logged_at=when)
+        return entry
+
+    def rollups(self, bucket):
+        return list(MoodRollup.objects.filter(bucket=bucket).order_by('period', 'mood').values_list('period', 'mood', 'count'))
+
+    def test_logging_a_mood_updates_every_bucket(self):
+        response = self.client.post('/api/moods/', {'mood': 'happy'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.client.post('/api/moods/', {'mood': 'happy'}, format='json')
+        today = timezone.localdate()
+        self.assertEqual(self.rollups('day'), [(today, 'happy', 2)])
+        self.assertEqual(self.rollups('week'), [(today - datetime.timedelta(days=today.weekday()), 'happy', 2)])
+        self.assertEqual(self.rollups('month'), [(today.replace(day=1), 'happy', 2)])
+
+    def test_edits_and_deletes_move_counts(self):
+        mood = Mood.objects.create(user=self.student, mood='happy')
+        mood = Mood.objects.get(pk=mood.pk)
+        mood.mood = 'calm'
+        mood.save()
+        self.assertEqual([m for _, m, _ in self.rollups('day')], ['calm'])
+        Mood.objects.get(pk=mood.pk).delete()
+        self.assertFalse(MoodRollup.objects.exists())
+
+    def test_summary_is_one_indexed_read(self):
+        self.client.post('/api/moods/', {'mood': 'happy'}, format='json')
+        self.client.post('/api/moods/', {'mood': 'sad'}, format='json')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/moods/summary/?bucket=month')
+        self.assertEqual(response.status_code, 200)
+        [point] = response.data['series']
+        self.assertEqual((point['total'], point['moods']), (2, {'happy': 1, 'sad': 1}))
+
+    def test_summary_rejects_unknown_buckets(self):
+        self.assertEqual(self.client.get('/api/moods/summary/?bucket=year').status_code, 400)
+        self.assertEqual(self.client.get('/api/moods/summary/?since=soon').status_code, 400)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        for mood in ['happy', 'sad', 'happy']:
+            self.client.post('/api/moods/', {'mood': mood}, format='json')
+        incremental = {bucket: self.rollups(bucket) for bucket in moodstats.BUCKETS}
+        MoodRollup.objects.all().delete()
+        call_command('rebuild_mood_rollups', stdout=io.StringIO())
+        self.assertEqual({bucket: self.rollups(bucket) for bucket in moodstats.BUCKETS}, incremental)
+
+    def test_summary_filters_by_date(self):
+        for day in [datetime.date(2026, 1, 30), datetime.date(2026, 2, 2), datetime.date(2026, 3, 3)]:
+            self.log('happy', timezone.make_aware(datetime.datetime.combine(day, datetime.time(12))))
+        moodstats.rebuild([self.student.pk])
+        response = self.client.get('/api/moods/summary/?bucket=week&since=2026-01-31&until=2026-02-28')
+        # The week of Jan 26 overlaps `since`
+        self.assertEqual(
+            [point['period'] for point in response.data['series']],
+            [datetime.date(2026, 1, 26), datetime.date(2026, 2, 2)],
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CohortAnalyticsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.until = datetime.date(2026, 3, 14)
+        rollups = []
+        for n, country in enumerate(['Ghana'] * 6 + ['Kenya'] * 5 + ['Mali'] * 2):
+            user = User.objects.create(username=f'student{n}', email=f'student{n}@example.com', role='student', country=country)
+            for day in range(14):
+                # Ghana turns from sad to happy in the second week; everyone else stays calm
+                mood = 'calm' if country != 'Ghana' else ('sad' if day < 7 else 'happy')
+                rollups.append(MoodRollup(user=user, bucket='day', period=self.until - datetime.timedelta(days=13 - day), mood=mood, count=1))
+        MoodRollup.objects.bulk_create(rollups)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, **params):
+        return self.client.get('/api/moods/cohorts/', {'until': self.until.isoformat(), 'since': '2026-03-01', **params})
+
+    def test_cohort_trends(self):
+        response = self.get(group_by='country')
+        self.assertEqual(response.status_code, 200)
+        ghana, kenya = response.data['cohorts']
+        self.assertEqual((ghana['cohort'], ghana['users'], ghana['entries']), ({'country': 'Ghana'}, 6, 84))
+        self.assertEqual(ghana['distribution'], {'sad': 0.5, 'happy': 0.5, 'calm': 0.0})
+        self.assertEqual(ghana['week_over_week'], {'sad': [-100.0], 'happy': [100.0], 'calm': [0.0]})
+        self.assertEqual(ghana['moving_average']['happy'][-1], 6.0)
+        self.assertEqual(kenya['daily_entries'], [5] * 14)
+        # Mali has too few students to report
+        self.assertEqual(response.data['suppressed_cohorts'], 1)
+
+    def test_everyone_as_one_cohort(self):
+        [everyone] = self.get(group_by='').data['cohorts']
+        self.assertEqual((everyone['cohort'], everyone['users'], everyone['entries']), ({}, 13, 182))
+
+    def test_results_are_cached_per_window(self):
+        self.get()
+        with self.assertNumQueries(0):
+            self.get()
+        with self.assertNumQueries(2):
+            self.get(since='2026-03-02')
+
+    def test_admin_only(self):
+        self.client.force_authenticate(User.objects.get(username='student0'))
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.get(group_by='email').status_code, 400)
+        self.assertEqual(self.get(since='2026-04-01').status_code, 400)
+
+
+class JournalTestCase(TestCase):
+    def setUp(self):
+        self.student = User.objects.create(username='student1', email='student1@example.com', role='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_list_defers_the_entry_column(self):
+        Journal.objects.create(user=self.student, entry='x' * 5000)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/journals/')
+        self.assertNotIn('entry', response.data['results'][0])
+        self.assertFalse(any('"core_journal"."entry"' in q['sql'] for q in queries.captured_queries))
+
+    def test_detail_returns_the_entry(self):
+        journal = Journal.objects.create(user=self.student, entry='Long day')
+        self.assertEqual(self.client.get(f'/api/journals/{journal.pk}/').data['entry'], 'Long day')
+
+
+class JournalSearchTestCase(TestCase):
+    def setUp(self):
+        self.student = User.objects.create(username='student1', email='student1@example.com', role='student')
+        self.other = User.objects.create(username='student2', email='student2@example.com', role='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.walk = Journal.objects.create(user=self.student, entry='Long walk by the river. ' + 'Then dinner. ' * 300)
+        Journal.objects.create(user=self.student, entry='Exams all week, barely slept.')
+        Journal.objects.create(user=self.other, entry='Walked along the river with friends.')
+
+    def search(self, q):
+        return self.client.get('/api/journals/', {'q': q})
+
+    def test_search_returns_own_matches_with_snippets(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.search('river walk')
+        [hit] = response.data['results']
+        self.assertEqual(hit['id'], self.walk.pk)
+        self.assertIn('<mark>walk</mark>', hit['snippet'])
+        self.assertLess(len(hit['snippet']), 200)
+        self.assertNotIn('entry', hit)
+        self.assertFalse(any('"core_journal"."entry"' in q['sql'] for q in queries.captured_queries))
+
+    def test_prefix_and_stemmed_terms(self):
+        self.assertEqual(len(self.search('exa').data['results']), 1)
+        self.assertEqual(len(self.search('walking').data['results']), 1)
+
+    def test_search_is_scoped_to_the_owner(self):
+        admin = User.objects.create(username='admin', email='admin@example.com', role='admin')
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.search('river').data['results'], [])
+        self.client.force_authenticate(self.other)
+        self.assertEqual(len(self.search('river').data['results']), 1)
+
+    def test_other_backends_are_scoped_to_the_owner(self):
+        with mock.patch('core.search.connection', mock.Mock(vendor='mysql')):
+            hits = self.search('river').data['results']
+        self.assertEqual([hit['id'] for hit in hits], [self.walk.pk])
+
+    def test_edits_and_deletes_update_the_index(self):
+        self.walk.entry = 'Quiet evening.'
+        self.walk.save()
+        self.assertEqual(self.search('river').data['results'], [])
+        self.assertEqual(len(self.search('quiet').data['results']), 1)
+        self.walk.delete()
+        self.assertEqual(self.search('quiet').data['results'], [])
+
+
+class OfflineSyncTestCase(TestCase):
+    def setUp(self):
+        self.student = User.objects.create(username='student1', email='student1@example.com', role='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.morning = timezone.make_aware(datetime.datetime(2026, 3, 3, 8, 0))
+        self.records = [
+            {'type': 'mood', 'key': 'm1', 'recorded_at': self.morning.isoformat(), 'mood': 'calm'},
+            {'type': 'mood', 'key': 'm2', 'recorded_at': (self.morning + datetime.timedelta(hours=4)).isoformat(), 'mood': 'calm'},
+            {'type': 'mood', 'key': 'm3', 'recorded_at': self.morning.isoformat(), 'mood': 'tired'},
+            {'type': 'journal', 'key': 'j1', 'recorded_at': self.morning.isoformat(), 'entry': 'Walked to the river before class.'},
+        ]
+
+    def sync(self, records):
+        return self.client.post('/api/sync/', {'records': records}, format='json')
+
+    def test_batch_is_saved_with_client_timestamps(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.sync(self.records)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['duplicates'], response.data['invalid']), (4, 0, 0))
+        self.assertLessEqual(len(queries), 12)
+
+        journal = Journal.objects.get(pk=response.data['results'][3]['id'])
+        self.assertEqual(journal.created_at, self.morning)
+        self.assertEqual(Mood.objects.filter(user=self.student, logged_at=self.morning).count(), 2)
+        day = moodstats.summary(self.student.pk, 'day')
+        self.assertEqual(day, [{'period': datetime.date(2026, 3, 3), 'total': 3, 'moods': {'calm': 2, 'tired': 1}}])
+        hits = self.client.get('/api/journals/', {'q': 'river'}).data['results']
+        self.assertEqual([hit['id'] for hit in hits], [journal.pk])
+
+    def test_replayed_batch_creates_nothing(self):
+        first = self.sync(self.records).data
+        again = self.sync(self.records + [dict(self.records[0])]).data
+        self.assertEqual((again['created'], again['duplicates']), (0, 5))
+        self.assertEqual([r['id'] for r in again['results'][:4]], [r['id'] for r in first['results']])
+        self.assertEqual(Mood.objects.count(), 3)
+        self.assertEqual(Journal.objects.count(), 1)
+        self.assertEqual(sum(moodstats.summary(self.student.pk, 'month')[0]['moods'].values()), 3)
+
+    def test_keys_are_per_user_and_type(self):
+        self.sync(self.records)
+        other = User.objects.create(username='student2', email='student2@example.com', role='student')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.sync(self.records).data['created'], 4)
+        self.assertEqual(self.sync([dict(self.records[3], type='mood', mood='calm')]).data['created'], 1)
+
+    def test_invalid_records_are_reported_and_skipped(self):
+        future = (timezone.now() + datetime.timedelta(hours=1)).isoformat()
+        response = self.sync([
+            self.records[0],
+            {'type': 'mood', 'key': 'm9', 'recorded_at': self.morning.isoformat()},
+            {'type': 'journal', 'key': 'j9', 'recorded_at': future, 'entry': 'From the future'},
+            'not a record',
+        ])
+        self.assertEqual((response.data['created'], response.data['invalid']), (1, 3))
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'invalid', 'invalid', 'invalid'])
+        self.assertIn('mood', response.data['results'][1]['errors'])
+        self.assertIn('recorded_at', response.data['results'][2]['errors'])
+        self.assertIsNone(response.data['results'][3]['key'])
+
+    def test_rejects_malformed_batches(self):
+        self.assertEqual(self.sync([]).status_code, 400)
+        self.assertEqual(self.client.post('/api/sync/', {'records': 'm1'}, format='json').status_code, 400)
+        self.assertEqual(self.sync([self.records[0]] * 501).status_code, 400)
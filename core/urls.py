@@ -13,6 +13,7 @@ from .views import (
     MoodViewSet,
     JournalViewSet,
     ForumPostViewSet,
+    sync_records,
     update_email,
     change_password,
 )
@@ -46,4 +47,5 @@ urlpatterns = [
     path('users/change-password/', change_password),
     path('register/', register, name='register'),
     path('login/', LoginView.as_view(), name='login'),
+    path('sync/', sync_records, name='sync'),
 ]
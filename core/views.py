@@ -1,12 +1,22 @@
+import csv
+import datetime
+import io
+import json
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from rest_framework.permissions import IsAuthenticated
-from drf_spectacular.utils import extend_schema, OpenApiExample
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, inline_serializer, OpenApiExample, OpenApiParameter
 from .serializers import RegisterSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
@@ -15,15 +25,19 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from .serializers import MeSerializer
 from .models import (
     Book, User, Transaction, Resource, Quiz, Question,
-    Submission, MentorshipRequest, Mood, Journal, ForumPost
+    Submission, MentorshipRequest, Mood, Journal, ForumPost, QuizStats, RegradeRun
 )
 from .serializers import (
-    UserSerializer, BookSerializer, TransactionSerializer,
+    UserSerializer, BookSerializer, TransactionSerializer, BulkLoanSerializer,
     ResourceSerializer, QuizSerializer, QuestionSerializer,
-    SubmissionSerializer, MentorshipRequestSerializer, MentorshipRequestUpdateSerializer,
-    MoodSerializer, JournalSerializer, ForumPostSerializer
+    SubmissionSerializer, SubmissionListSerializer, QuizAttemptSerializer, RegradeRunSerializer, MentorshipRequestSerializer, MentorshipRequestUpdateSerializer,
+    MoodSerializer, JournalSerializer, JournalSearchResultSerializer, JournalDetailSerializer, SyncRecordSerializer, ForumPostSerializer
 )
-from .permissions import IsAdmin, IsStudent,IsMentorAdminOrReadOnly, ReadOnly, IsOwnerOrAdmin
+from .permissions import IsAdmin, IsMentor, IsStudent,IsMentorAdminOrReadOnly, ReadOnly, IsOwnerOrAdmin
+from .filters import TransactionFilter
+from .search import search_books, search_journals
+from .pagination import OptInCursorPagination
+from . import attempts, caching, cohorts, grading, itemanalysis, library, moodstats, quizstats, regrade, sync
 
 User = get_user_model()
 
@@ -219,30 +233,77 @@ class BookViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['title', 'author', 'isbn']
+    pagination_class = OptInCursorPagination
+    cursor_ordering = 'title'
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        return Response(caching.get_book_page(request, lambda: build(request, *args, **kwargs).data))
+
+    def retrieve(self, request, *args, **kwargs):
+        build = super().retrieve
+        try:
+            # '01' and '1' are the same book, and bump_books works on integer pks
+            pk = int(kwargs['pk'])
+        except ValueError:
+            return build(request, *args, **kwargs)
+        return Response(caching.get_book(pk, lambda: build(request, *args, **kwargs).data))
+
+    @extend_schema(summary='Book cache hit/miss counters', tags=['Library'])
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        return Response(caching.stats())
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        q = self.request.query_params.get('q', '').strip()
+        if q and self.action == 'list':
+            queryset = search_books(queryset, q)
+        return queryset
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update']:
+        if self.action in ['create', 'update', 'partial_update', 'bulk_borrow', 'bulk_return']:
             return [IsMentorAdminOrReadOnly()]
-        if self.action == 'destroy':
+        if self.action in ['destroy', 'import_catalogue', 'cache_stats']:
             return [IsAdmin()]
         if self.action in ['borrow', 'return_book']:
             return [IsStudent()]
         return [ReadOnly()]
 
+    @extend_schema(
+        summary='Import books from a CSV or JSONL file',
+        tags=['Library'],
+        request={
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {
+                    'file': {'type': 'string', 'format': 'binary'},
+                    'format': {'type': 'string', 'enum': ['csv', 'jsonl']},
+                },
+            }
+        },
+    )
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_catalogue(self, request):
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'A file is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+        if fmt not in ('csv', 'jsonl'):
+            return Response({'error': 'format must be csv or jsonl'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(library.import_books(upload.file, fmt))
+
     @extend_schema(summary='Borrow a book', tags=['Library'])
     @action(detail=True, methods=['post'])
     def borrow(self, request, pk=None):
         book = self.get_object()
 
-        if book.copies_available < 1:
-            return Response({'error': 'No copies available'}, status=status.HTTP_400_BAD_REQUEST)
-
-        if Transaction.objects.filter(user=request.user, book=book, return_date__isnull=True).exists():
-            return Response({'error': 'You already borrowed this book'}, status=status.HTTP_400_BAD_REQUEST)
-
-        Transaction.objects.create(user=request.user, book=book)
-        book.copies_available -= 1
-        book.save()
+        try:
+            library.borrow_book(request.user, book.pk)
+        except library.BorrowError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({'message': f'You borrowed {book.title} successfully'})
 
@@ -251,32 +312,144 @@ class BookViewSet(viewsets.ModelViewSet):
     def return_book(self, request, pk=None):
         book = self.get_object()
 
-        transaction = Transaction.objects.filter(
-            user=request.user, book=book, return_date__isnull=True
-        ).first()
+        try:
+            library.return_book(request.user, book.pk)
+        except library.BorrowError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not transaction:
-            return Response({'error': 'No active borrow found'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': f'You returned {book.title} successfully'})
 
-        transaction.return_date = timezone.now()
-        transaction.save()
+    def _bulk_response(self, results):
+        succeeded = sum(1 for result in results if result['ok'])
+        return Response({
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results,
+        })
+
+    @extend_schema(
+        summary='Borrow books for a class set',
+        tags=['Library'],
+        request=BulkLoanSerializer,
+        examples=[
+            OpenApiExample(
+                'Example request',
+                value={'items': [{'user': 3, 'book': 12}, {'user': 4, 'book': 12}]},
+            )
+        ],
+    )
+    @action(detail=False, methods=['post'], url_path='bulk-borrow')
+    def bulk_borrow(self, request):
+        serializer = BulkLoanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._bulk_response(library.bulk_borrow(serializer.validated_data['items']))
+
+    @extend_schema(summary='Return books for a class set', tags=['Library'], request=BulkLoanSerializer)
+    @action(detail=False, methods=['post'], url_path='bulk-return')
+    def bulk_return(self, request):
+        serializer = BulkLoanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._bulk_response(library.bulk_return(serializer.validated_data['items']))
+
+
+# Exported column name -> queryset lookup
+EXPORT_COLUMNS = {
+    'id': 'id',
+    'user': 'user__username',
+    'book': 'book__title',
+    'isbn': 'book__isbn',
+    'checkout_date': 'checkout_date',
+    'due_date': 'due_date',
+    'return_date': 'return_date',
+    'status': 'status',
+    'is_overdue': 'overdue',
+}
+
+
+def _in_blocks(lines, size=500):
+    '''Join lines into blocks so each streamed chunk carries many rows.'''
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= size:
+            yield ''.join(block)
+            block = []
+    if block:
+        yield ''.join(block)
+
+
+def _export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(EXPORT_COLUMNS)
+    yield from _in_blocks(line(row) for row in rows)
+
+
+def _export_ndjson(rows):
+    columns = list(EXPORT_COLUMNS)
+    yield from _in_blocks(
+        json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n' for row in rows
+    )
 
-        book.copies_available += 1
-        book.save()
 
-        return Response({'message': f'You returned {book.title} successfully'})
+EXPORT_WRITERS = {
+    'csv': ('text/csv', 'csv', _export_csv),
+    'ndjson': ('application/x-ndjson', 'ndjson', _export_ndjson),
+}
 
 
 @extend_schema(tags=['Library'])
 class TransactionViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = TransactionFilter
+    pagination_class = OptInCursorPagination
+    cursor_ordering = '-checkout_date'
 
     def get_queryset(self):
         user = self.request.user
+        # user and book are rendered via __str__, so join them up front
+        queryset = Transaction.objects.with_overdue().select_related('user', 'book')
         if getattr(user, 'role', None) == 'admin':
-            return Transaction.objects.all()
-        return Transaction.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
+
+    def get_permissions(self):
+        if self.action == 'export':
+            return [IsAdmin()]
+        return super().get_permissions()
+
+    @extend_schema(
+        summary='Export circulation history as CSV or NDJSON',
+        tags=['Library'],
+        parameters=[
+            OpenApiParameter('output', str, enum=['csv', 'ndjson'], description='Defaults to csv.'),
+        ],
+        responses={(200, 'text/csv'): OpenApiTypes.STR, (200, 'application/x-ndjson'): OpenApiTypes.STR},
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_WRITERS:
+            return Response({'error': 'output must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .values_list(*EXPORT_COLUMNS.values())
+            .iterator(chunk_size=2000)  # server-side cursor where supported
+        )
+        content_type, extension, write = EXPORT_WRITERS[output]
+        response = StreamingHttpResponse(write(rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="transactions.{extension}"'
+        return response
 
 
 # -------------------------
@@ -306,9 +479,87 @@ class ResourceViewSet(viewsets.ModelViewSet):
     ],
 )
 class QuizViewSet(viewsets.ModelViewSet):
-    queryset = Quiz.objects.all()
+    queryset = Quiz.objects.select_related('created_by').prefetch_related('questions').order_by('pk')
     serializer_class = QuizSerializer
     permission_classes = [IsMentorAdminOrReadOnly]
+    # Numeric ids only, so the stats actions can use pk without a lookup
+    lookup_value_regex = r'\d+'
+
+    def get_permissions(self):
+        if self.action in ['stats', 'item_analysis', 'regrade']:
+            return [(IsMentor | IsAdmin)()]
+        if self.action == 'start':
+            return [IsStudent()]
+        return super().get_permissions()
+
+    def _quiz_exists(self, pk):
+        return Quiz.objects.filter(pk=pk).exists()
+
+    @extend_schema(summary='Attempt count, pass rate and averages for a quiz', tags=['Quizzes'])
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        # Read the maintained totals directly; no Submission scan, no quiz prefetch
+        stats = QuizStats.objects.filter(quiz_id=pk).first()
+        if stats is None and not self._quiz_exists(pk):
+            return Response({'error': 'Quiz not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'quiz': int(pk), **quizstats.summary(stats)})
+
+    @extend_schema(summary='Difficulty and discrimination of each question in a quiz', tags=['Quizzes'])
+    @action(detail=True, methods=['get'], url_path='item-analysis')
+    def item_analysis(self, request, pk=None):
+        if not self._quiz_exists(pk):
+            return Response({'error': 'Quiz not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'quiz': int(pk), **itemanalysis.item_analysis(pk)})
+
+    @extend_schema(
+        summary='Latest regrade of past submissions, or queue a new one (POST)',
+        tags=['Quizzes'],
+        request=None,
+        responses=RegradeRunSerializer,
+    )
+    @action(detail=True, methods=['get', 'post'])
+    def regrade(self, request, pk=None):
+        if not self._quiz_exists(pk):
+            return Response({'error': 'Quiz not found'}, status=status.HTTP_404_NOT_FOUND)
+        if request.method == 'POST':
+            return Response(RegradeRunSerializer(regrade.enqueue(pk)).data, status=status.HTTP_202_ACCEPTED)
+        run = RegradeRun.objects.filter(quiz_id=pk).order_by('-pk').first()
+        if run is None:
+            return Response({'status': None})
+        return Response(RegradeRunSerializer(run).data)
+
+    @extend_schema(
+        summary='Start (or resume) a timed attempt and get its questions and session token',
+        tags=['Quizzes'],
+        request=None,
+        responses=QuizAttemptSerializer,
+    )
+    @action(detail=True, methods=['post'])
+    def start(self, request, pk=None):
+        quiz = Quiz.objects.filter(pk=pk).first()
+        if quiz is None:
+            return Response({'error': 'Quiz not found'}, status=status.HTTP_404_NOT_FOUND)
+        attempt, session = attempts.start(request.user, quiz)
+        serializer = QuizAttemptSerializer(attempt, context={'session': session})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        summary='Top students for a quiz',
+        tags=['Quizzes'],
+        parameters=[
+            OpenApiParameter('limit', int, description=f'Entries to return (max {quizstats.LEADERBOARD_SIZE}).'),
+        ],
+    )
+    @action(detail=True, methods=['get'])
+    def leaderboard(self, request, pk=None):
+        try:
+            limit = min(max(int(request.query_params.get('limit', quizstats.LEADERBOARD_SIZE)), 1), quizstats.LEADERBOARD_SIZE)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        entries = quizstats.leaderboard(pk, limit)
+        if not entries and not self._quiz_exists(pk):
+            return Response({'error': 'Quiz not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'quiz': int(pk), 'entries': entries})
 
 
 @extend_schema(tags=['Quizzes'])
@@ -317,57 +568,92 @@ class QuestionViewSet(viewsets.ModelViewSet):
     serializer_class = QuestionSerializer
     permission_classes = [IsMentorAdminOrReadOnly]
 
+# Upper bound for ?wait= on submission results, in seconds
+MAX_RESULT_WAIT = 30
+
+
 @extend_schema(tags=['Quizzes'])
 class SubmissionViewSet(viewsets.ModelViewSet):
     queryset = Submission.objects.all()
     serializer_class = SubmissionSerializer
     permission_classes = [IsStudent]
+    pagination_class = OptInCursorPagination
+    cursor_ordering = '-submitted_at'
 
     def get_queryset(self):
         user = self.request.user
+        queryset = Submission.objects.select_related('user')
         if getattr(user, 'role', None) == 'admin':
-            return Submission.objects.all()
-        return Submission.objects.filter(user=user)
-
-    def perform_create(self, serializer):
-        submission = serializer.save(user=self.request.user)
-
-        quiz = submission.quiz
-        student_answers = submission.answers or {}
-
-        correct = 0
-        total = quiz.questions.count()
-        feedback_list = []
-
-        # Loop through all questions in the quiz
-        for question in quiz.questions.all():
-            qid = str(question.id)
-            student_answer = student_answers.get(qid)
-            is_correct = student_answer == question.correct_answer
+            return queryset
+        return queryset.filter(user=user)
 
-            if is_correct:
-                correct += 1
-
-            feedback_list.append({
-                "question_id": question.id,
-                "question": question.text,
-                "your_answer": student_answer,
-                "correct_answer": question.correct_answer,
-                "is_correct": is_correct
-            })
-
-        # Compute percentage safely
-        percentage = round((correct / total) * 100) if total > 0 else 0
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return SubmissionListSerializer
+        return SubmissionSerializer
 
-        # Pass/fail logic
-        status = "pass" if percentage >= 50 else "fail"
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if response.data.get('status') == 'pending':
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
 
-        # Save results
-        submission.score = correct
-        submission.percentage = percentage
-        submission.status = status
-        submission.feedback = feedback_list
-        submission.save()
+    def perform_create(self, serializer):
+        quiz = serializer.validated_data['quiz']
+        token = serializer.validated_data.pop('session', None)
+        attempt_id, session, extra = None, None, {}
+        # Timed quizzes are held to the clock started at start, and question-bank
+        # quizzes are graded on the questions drawn there
+        if token or quiz.duration > 0 or quiz.sample_size is not None or settings.QUIZ_SESSIONS_REQUIRED:
+            if not token:
+                raise ValidationError({'error': 'Start the quiz first'})
+            try:
+                attempt_id, session, extra['late'] = attempts.check_session(token, self.request.user, quiz)
+            except attempts.SessionError as e:
+                raise ValidationError({'error': str(e)})
+            if quiz.sample_size is not None:
+                extra['question_ids'] = session['question_ids']
+
+        if settings.ASYNC_GRADING:
+            # Accept now, let the grading workers pick it up
+            with transaction.atomic():
+                submission = serializer.save(user=self.request.user, status='pending', **extra)
+                self._finish_attempt(attempt_id, submission)
+                grading.enqueue(submission)
+            return
+
+        # Grade in memory against the cached answer key, then insert once
+        key = grading.answer_key(quiz.pk)
+        if 'question_ids' in extra:
+            key = grading.select(key, extra.pop('question_ids'))
+        result = grading.grade(serializer.validated_data.get('answers'), key)
+        with transaction.atomic():
+            submission = serializer.save(user=self.request.user, **result, **extra)
+            self._finish_attempt(attempt_id, submission)
+            quizstats.record([submission])
+
+    def _finish_attempt(self, attempt_id, submission):
+        if attempt_id is not None and not attempts.finish(attempt_id, submission):
+            # Rolls back the submission saved in this transaction
+            raise ValidationError({'error': 'This attempt was already submitted'})
+
+    @extend_schema(
+        summary='Get a submission result, optionally waiting for grading',
+        tags=['Quizzes'],
+        parameters=[
+            OpenApiParameter('wait', int, description=f'Seconds to wait while pending (max {MAX_RESULT_WAIT}).'),
+        ],
+    )
+    @action(detail=True, methods=['get'])
+    def result(self, request, pk=None):
+        submission = self.get_object()
+        try:
+            wait = min(max(int(request.query_params.get('wait', 0)), 0), MAX_RESULT_WAIT)
+        except ValueError:
+            return Response({'error': 'wait must be a number of seconds'}, status=status.HTTP_400_BAD_REQUEST)
+        if wait and submission.status == 'pending':
+            submission = grading.wait_for_result(submission.pk, wait)
+        return Response(self.get_serializer(submission).data)
 
 
 @extend_schema(tags=['Mentorship'])
@@ -388,35 +674,153 @@ class MentorshipRequestViewSet(viewsets.ModelViewSet):
 # Wellbeing Management
 # -------------------------
 
+# Longest range, in days, for mood cohort analytics
+MAX_COHORT_WINDOW = 366
+
+
 @extend_schema(tags=['Mood'])
 class MoodViewSet(viewsets.ModelViewSet):
     queryset = Mood.objects.all()
     serializer_class = MoodSerializer
     permission_classes = [IsStudent]
 
+    def get_permissions(self):
+        if self.action == 'cohort_analytics':
+            return [IsAdmin()]
+        return super().get_permissions()
+
     def get_queryset(self):
         return Mood.objects.filter(user=self.request.user)
 
+    @extend_schema(
+        summary='Mood counts per day, week or month for charts',
+        tags=['Mood'],
+        parameters=[
+            OpenApiParameter('bucket', str, enum=moodstats.BUCKETS, description='Bucket size (default day).'),
+            OpenApiParameter('since', OpenApiTypes.DATE, description='First day to include.'),
+            OpenApiParameter('until', OpenApiTypes.DATE, description='Last day to include.'),
+        ],
+    )
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in moodstats.BUCKETS:
+            return Response({'error': f'bucket must be one of {", ".join(moodstats.BUCKETS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            since, until = (
+                datetime.date.fromisoformat(value) if value else None
+                for value in (request.query_params.get('since'), request.query_params.get('until'))
+            )
+        except ValueError:
+            return Response({'error': 'since and until must be dates (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'bucket': bucket, 'series': moodstats.summary(request.user.pk, bucket, since, until)})
+
+    @extend_schema(
+        summary='Mood trends across cohorts of students (admin only)',
+        tags=['Mood'],
+        parameters=[
+            OpenApiParameter('since', OpenApiTypes.DATE, description='First day (default: 4 weeks before until).'),
+            OpenApiParameter('until', OpenApiTypes.DATE, description='Last day (default: today).'),
+            OpenApiParameter(
+                'group_by', str,
+                description=f'Comma-separated cohort fields out of {", ".join(cohorts.GROUP_FIELDS)}; empty for everyone.',
+            ),
+        ],
+    )
+    @action(detail=False, methods=['get'], url_path='cohorts')
+    def cohort_analytics(self, request):
+        params = request.query_params
+        group_by = [field for field in params.get('group_by', ','.join(cohorts.GROUP_FIELDS)).split(',') if field]
+        if any(field not in cohorts.GROUP_FIELDS for field in group_by) or len(set(group_by)) != len(group_by):
+            return Response({'error': f'group_by must be made of {", ".join(cohorts.GROUP_FIELDS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            until = datetime.date.fromisoformat(params['until']) if params.get('until') else timezone.localdate()
+            since = datetime.date.fromisoformat(params['since']) if params.get('since') else until - datetime.timedelta(days=27)
+        except ValueError:
+            return Response({'error': 'since and until must be dates (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= (until - since).days < MAX_COHORT_WINDOW:
+            return Response(
+                {'error': f'since must be on or before until, at most {MAX_COHORT_WINDOW} days apart'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(cohorts.cohort_analytics(since, until, group_by))
+
 
 @extend_schema(
     tags=['Journal'],
     examples=[
         OpenApiExample(
             'Example journal entry',
-            value={'title': 'My day', 'content': 'Today was great'},
+            value={'entry': 'Today was great'},
         )
     ],
 )
 class JournalViewSet(viewsets.ModelViewSet):
     queryset = Journal.objects.all()
-    serializer_class = JournalSerializer
+    serializer_class = JournalDetailSerializer
     permission_classes = [IsOwnerOrAdmin]
+    pagination_class = OptInCursorPagination
+    cursor_ordering = '-created_at'
+
+    def _search_query(self):
+        return self.request.query_params.get('q', '').strip() if self.action == 'list' else ''
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('q', str, description="Full-text search over your own entries, best match first."),
+        ],
+        responses=JournalSearchResultSerializer(many=True),
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     def get_queryset(self):
         user = self.request.user
+        queryset = Journal.objects.select_related('user')
+        if self.action == 'list':
+            # Entry text is only returned by the detail view
+            queryset = queryset.defer('entry')
+            q = self._search_query()
+            if q:
+                # Always the requester's own entries, admins included
+                return search_journals(queryset, user, q)
         if getattr(user, 'role', None) == 'admin':
-            return Journal.objects.all()
-        return Journal.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return JournalSearchResultSerializer if self._search_query() else JournalSerializer
+        return JournalDetailSerializer
+
+
+@extend_schema(
+    summary='Upload moods and journals recorded offline in one batch',
+    tags=['Mood', 'Journal'],
+    request=inline_serializer('SyncBatch', {'records': SyncRecordSerializer(many=True, max_length=sync.MAX_RECORDS)}),
+    responses={200: OpenApiTypes.OBJECT},
+    examples=[
+        OpenApiExample(
+            'Example batch',
+            value={
+                'records': [
+                    {'type': 'mood', 'key': 'b2f6c1d0-mood-1', 'recorded_at': '2026-03-03T08:15:00Z', 'mood': 'calm'},
+                    {'type': 'journal', 'key': 'b2f6c1d0-journal-1', 'recorded_at': '2026-03-03T21:40:00Z', 'entry': 'A good day.'},
+                ]
+            },
+            request_only=True,
+        )
+    ],
+)
+@api_view(['POST'])
+@permission_classes([IsStudent])
+def sync_records(request):
+    records = request.data.get('records') if isinstance(request.data, dict) else None
+    if not isinstance(records, list) or not records:
+        return Response({'error': 'records must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(records) > sync.MAX_RECORDS:
+        return Response({'error': f'At most {sync.MAX_RECORDS} records per request'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(sync.apply(request.user, [SyncRecordSerializer(data=record) for record in records]))
 
 
 @extend_schema(tags=['Forum'])
@@ -424,6 +828,11 @@ class ForumPostViewSet(viewsets.ModelViewSet):
     queryset = ForumPost.objects.all()
     serializer_class = ForumPostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OptInCursorPagination
+    cursor_ordering = '-created_at'
+
+    def get_queryset(self):
+        return ForumPost.objects.select_related('user')
     
     def perform_create(self, serializer): 
        serializer.save(user=self.request.user)